@@ -1,8 +1,9 @@
 """
 Configuration settings for AI Tutor Backend
 """
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Optional, List
 
 
 class Settings(BaseSettings):
@@ -11,7 +12,8 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
-        case_sensitive=False
+        case_sensitive=False,
+        frozen=True  # Resolved once at startup, read-only afterwards
     )
     
     # API Keys
@@ -21,20 +23,44 @@ class Settings(BaseSettings):
     LLM_MODEL: str = "llama-3.3-70b-versatile"  # Groq's fast model
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 2048
+    LLM_JSON_MODE: bool = True  # request response_format=json_object for JSON calls
+    
+    # LLM response cache (only calls at or below this temperature are cached)
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.3
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_TTL_SECONDS: int = 600
+    
+    # Connection pool of the shared async Groq client
+    LLM_HTTP_MAX_CONNECTIONS: int = 200
+    LLM_HTTP_MAX_KEEPALIVE: int = 50
+    LLM_HTTP2: bool = False  # multiplex calls over fewer connections (needs the h2 package)
     
     # Application Settings
     APP_NAME: str = "AI Tutor Backend"
     DEBUG: bool = True
     
+    # CORS - JSON list of allowed origins, e.g. '["https://app.example.com"]'
+    CORS_ORIGINS: List[str] = ["*"]
+    
     # Data Paths
     SESSIONS_DIR: str = "data/sessions"
     CURRICULUM_DIR: str = "data/curriculum"
     
+    # In-process cache of recently used session files (per worker)
+    SESSION_CACHE_MAX_ENTRIES: int = 512
+    SESSION_CACHE_TTL_SECONDS: int = 60
+    
     # Session Settings
     MAX_DIAGNOSTIC_QUESTIONS: int = 6
     MASTERY_THRESHOLD: float = 0.7  # 70% to pass
     MAX_CONCEPT_ATTEMPTS: int = 3
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings (.env is parsed only once)"""
+    return Settings()
+
+
 # Global settings instance
-settings = Settings()
+settings = get_settings()
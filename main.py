@@ -6,25 +6,35 @@ for Indian school students (Class 6-10).
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from contextlib import asynccontextmanager
 import os
 
+import orjson
+
 from config import settings
 from routers import session_router, chat_router
+from services import llm_service
 
 
 # ============ Application Lifespan ============
 
+# Set once the data directories have been prepared in this process
+_data_dirs_ready = False
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events"""
+    global _data_dirs_ready
+    
     # Startup
     print("🚀 Starting AI Tutor Backend...")
     
-    # Ensure data directories exist
-    os.makedirs(settings.SESSIONS_DIR, exist_ok=True)
-    os.makedirs(settings.CURRICULUM_DIR, exist_ok=True)
+    # Ensure data directories exist (sessions dir is created by SessionManager on import)
+    if not _data_dirs_ready:
+        os.makedirs(settings.CURRICULUM_DIR, exist_ok=True)
+        _data_dirs_ready = True
     
     # Check Groq API key
     if not settings.GROQ_API_KEY:
@@ -32,6 +42,12 @@ async def lifespan(app: FastAPI):
     else:
         print("✅ Groq API key configured")
     
+    # One Groq client (and connection pool) shared by all requests
+    llm_service.start()
+    
+    # Build (and cache) the OpenAPI schema now instead of on the first /docs hit
+    app.openapi()
+    
     print(f"📁 Sessions directory: {settings.SESSIONS_DIR}")
     print(f"🤖 LLM Model: {settings.LLM_MODEL}")
     print("✅ AI Tutor Backend ready!")
@@ -40,6 +56,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down AI Tutor Backend...")
+    await llm_service.aclose()
 
 
 # ============ Create Application ============
@@ -64,15 +81,18 @@ app = FastAPI(
     5. Session wrap-up with summary
     """,
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
 # ============ CORS Middleware ============
 
+# A frozenset makes the per-request origin check a hash lookup when explicit
+# origins are configured; "*" keeps Starlette's allow-all fast path
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
+    allow_origins=frozenset(settings.CORS_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -87,47 +107,75 @@ app.include_router(chat_router)
 
 # ============ Root Endpoints ============
 
+# Both payloads depend only on (frozen) settings, so they are encoded once
+_ROOT_BODY = orjson.dumps({
+    "name": "AI Tutor Backend",
+    "version": "1.0.0",
+    "status": "running",
+    "docs": "/docs",
+    "redoc": "/redoc"
+})
+
+_HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "groq_configured": bool(settings.GROQ_API_KEY),
+    "model": settings.LLM_MODEL
+})
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
-    return {
-        "name": "AI Tutor Backend",
-        "version": "1.0.0",
-        "status": "running",
-        "docs": "/docs",
-        "redoc": "/redoc"
-    }
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "groq_configured": bool(settings.GROQ_API_KEY),
-        "model": settings.LLM_MODEL
-    }
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
 # ============ Error Handlers ============
 
+def _error_body(status_code: int, detail) -> bytes:
+    """Serialize the standard HTTP error payload"""
+    return orjson.dumps({
+        "success": False,
+        "error": detail,
+        "error_code": f"HTTP_{status_code}"
+    })
+
+
+# Bodies for the fixed-detail errors the routers raise, encoded once at import
+_PREBUILT_ERROR_BODIES = {
+    (status_code, detail): _error_body(status_code, detail)
+    for status_code, detail in [
+        (404, "Session not found"),
+        (500, "Failed to delete session"),
+    ]
+}
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions"""
-    return JSONResponse(
+    body = None
+    if isinstance(exc.detail, str):
+        body = _PREBUILT_ERROR_BODIES.get((exc.status_code, exc.detail))
+    if body is None:
+        body = _error_body(exc.status_code, exc.detail)
+    
+    return Response(
+        content=body,
         status_code=exc.status_code,
-        content={
-            "success": False,
-            "error": exc.detail,
-            "error_code": f"HTTP_{exc.status_code}"
-        }
+        media_type="application/json"
     )
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Handle general exceptions"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
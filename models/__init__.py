@@ -4,6 +4,7 @@ Models package - exports all data models
 from .questions import (
     QuestionType,
     Difficulty,
+    QuestionBase,
     MultipleChoiceQuestion,
     MultipleChoiceOption,
     TrueFalseQuestion,
@@ -25,6 +26,7 @@ from .session import (
     ConceptStatus,
     LearningStyle,
     StudentMood,
+    MessageRole,
     LearningPreferences,
     StudentSnapshot,
     DiagnosticQuestion,
@@ -41,6 +43,7 @@ from .session import (
     SessionMeta,
     CurrentPhase,
     Session,
+    utcnow,
 )
 
 from .schemas import (
@@ -55,12 +58,21 @@ from .schemas import (
     MessageResponse,
     QuestionDisplay,
     FeedbackDisplay,
+    StudyPlanConcept,
     StudyPlanDisplay,
     ProgressDisplay,
     CelebrationDisplay,
     SessionSummary,
+    DisplayItem,
     APIResponse,
     SessionCreatedResponse,
+    SessionDetailStats,
+    SessionDetailConcept,
+    SessionDetailStudyPlan,
+    SessionDetailAssessment,
+    SessionDetailDiagnostic,
+    SessionDetail,
+    SessionDetailResponse,
     ErrorResponse,
 )
 
@@ -68,6 +80,7 @@ __all__ = [
     # Questions
     "QuestionType",
     "Difficulty",
+    "QuestionBase",
     "MultipleChoiceQuestion",
     "MultipleChoiceOption",
     "TrueFalseQuestion",
@@ -88,6 +101,7 @@ __all__ = [
     "ConceptStatus",
     "LearningStyle",
     "StudentMood",
+    "MessageRole",
     "LearningPreferences",
     "StudentSnapshot",
     "DiagnosticQuestion",
@@ -104,6 +118,7 @@ __all__ = [
     "SessionMeta",
     "CurrentPhase",
     "Session",
+    "utcnow",
     
     # API Schemas
     "CreateSessionRequest",
@@ -117,11 +132,20 @@ __all__ = [
     "MessageResponse",
     "QuestionDisplay",
     "FeedbackDisplay",
+    "StudyPlanConcept",
     "StudyPlanDisplay",
     "ProgressDisplay",
     "CelebrationDisplay",
     "SessionSummary",
+    "DisplayItem",
     "APIResponse",
     "SessionCreatedResponse",
+    "SessionDetailStats",
+    "SessionDetailConcept",
+    "SessionDetailStudyPlan",
+    "SessionDetailAssessment",
+    "SessionDetailDiagnostic",
+    "SessionDetail",
+    "SessionDetailResponse",
     "ErrorResponse",
 ]
@@ -2,30 +2,35 @@
 Question type models for different UI components
 These models define the structure of questions sent to frontend
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Literal
-from enum import Enum
 
 
-class QuestionType(str, Enum):
-    """Types of questions that can be rendered in UI"""
-    MULTIPLE_CHOICE = "multiple_choice"
-    TRUE_FALSE = "true_false"
-    FILL_BLANK = "fill_blank"
-    SHORT_ANSWER = "short_answer"
-    NUMERIC = "numeric"
-    EQUATION = "equation"
-    MATCH_PAIRS = "match_pairs"
-
+# Types of questions that can be rendered in UI
+QuestionType = Literal[
+    "multiple_choice",
+    "true_false",
+    "fill_blank",
+    "short_answer",
+    "numeric",
+    "equation",
+    "match_pairs",
+]
 
-class Difficulty(str, Enum):
-    EASY = "easy"
-    MEDIUM = "medium"
-    HARD = "hard"
+Difficulty = Literal["easy", "medium", "hard"]
 
 
 # ============ Question Models for Frontend UI ============
 
+class QuestionBase(BaseModel):
+    """Fields shared by every question type"""
+    model_config = ConfigDict(frozen=True)
+    
+    question_id: str
+    difficulty: Difficulty
+    concept_tested: str
+
+
 class MultipleChoiceOption(BaseModel):
     """Single option in MCQ"""
     id: str
@@ -33,83 +38,65 @@ class MultipleChoiceOption(BaseModel):
     is_correct: bool = False  # Only used internally, not sent to frontend
 
 
-class MultipleChoiceQuestion(BaseModel):
+class MultipleChoiceQuestion(QuestionBase):
     """Multiple choice question structure"""
     type: Literal["multiple_choice"] = "multiple_choice"
-    question_id: str
     question_text: str
     options: List[MultipleChoiceOption]
     correct_option_id: str  # Hidden from frontend initially
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
     explanation: Optional[str] = None  # Shown after answering
 
 
-class TrueFalseQuestion(BaseModel):
+class TrueFalseQuestion(QuestionBase):
     """True/False question structure"""
     type: Literal["true_false"] = "true_false"
-    question_id: str
     statement: str
     correct_answer: bool
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
     explanation: Optional[str] = None
 
 
-class FillBlankQuestion(BaseModel):
+class FillBlankQuestion(QuestionBase):
     """Fill in the blank question"""
     type: Literal["fill_blank"] = "fill_blank"
-    question_id: str
     question_text: str  # Use ___ for blank
     correct_answers: List[str]  # Accept multiple correct answers
     case_sensitive: bool = False
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
     explanation: Optional[str] = None
 
 
-class ShortAnswerQuestion(BaseModel):
+class ShortAnswerQuestion(QuestionBase):
     """Short answer / open text question"""
     type: Literal["short_answer"] = "short_answer"
-    question_id: str
     question_text: str
     expected_keywords: List[str] = []  # For AI evaluation
     sample_answer: str  # For AI comparison
     max_length: int = 500
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
 
 
-class NumericQuestion(BaseModel):
+class NumericQuestion(QuestionBase):
     """Numeric answer question"""
     type: Literal["numeric"] = "numeric"
-    question_id: str
     question_text: str
     correct_answer: float
     tolerance: float = 0.01  # Allow small margin of error
     unit: Optional[str] = None  # e.g., "cm", "kg"
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
     explanation: Optional[str] = None
 
 
-class EquationQuestion(BaseModel):
+class EquationQuestion(QuestionBase):
     """Math equation solving question"""
     type: Literal["equation"] = "equation"
-    question_id: str
     question_text: str
     equation: str  # e.g., "2x + 5 = 13"
     variable: str = "x"
     correct_answer: float
     tolerance: float = 0.01
     show_steps: bool = True
-    difficulty: Difficulty
-    concept_tested: str
     hint: Optional[str] = None
     solution_steps: Optional[List[str]] = None
 
@@ -121,28 +108,29 @@ class MatchPair(BaseModel):
     right: str
 
 
-class MatchPairsQuestion(BaseModel):
+class MatchPairsQuestion(QuestionBase):
     """Match the pairs question"""
     type: Literal["match_pairs"] = "match_pairs"
-    question_id: str
     instruction: str
     pairs: List[MatchPair]
-    difficulty: Difficulty
-    concept_tested: str
 
 
 # ============ Union type for any question ============
 
-from typing import Union
-
-QuestionUnion = Union[
-    MultipleChoiceQuestion,
-    TrueFalseQuestion,
-    FillBlankQuestion,
-    ShortAnswerQuestion,
-    NumericQuestion,
-    EquationQuestion,
-    MatchPairsQuestion
+from typing import Union, Annotated
+
+# Discriminated on `type` so validation dispatches straight to one model
+QuestionUnion = Annotated[
+    Union[
+        MultipleChoiceQuestion,
+        TrueFalseQuestion,
+        FillBlankQuestion,
+        ShortAnswerQuestion,
+        NumericQuestion,
+        EquationQuestion,
+        MatchPairsQuestion
+    ],
+    Field(discriminator="type")
 ]
 
 
@@ -2,14 +2,13 @@
 API Request and Response schemas
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal, Union, Annotated
 from datetime import datetime
-from enum import Enum
 
 from .session import (
     Session, SessionStatus, CurrentPhase, LearningStyle,
     StudyPlan, ConceptPlan, SessionStats, StudentSnapshot,
-    LearningPreferences
+    LearningPreferences, PhaseStatus, ConceptStatus, utcnow
 )
 from .questions import QuestionUnion, QuestionType, AnswerEvaluation
 
@@ -69,28 +68,29 @@ class EndSessionRequest(BaseModel):
 
 # ============ Response Models ============
 
-class UIAction(str, Enum):
-    """Actions frontend should take"""
-    SHOW_QUESTION = "show_question"
-    SHOW_MESSAGE = "show_message"
-    SHOW_FEEDBACK = "show_feedback"
-    SHOW_STUDY_PLAN = "show_study_plan"
-    SHOW_PROGRESS = "show_progress"
-    SHOW_CELEBRATION = "show_celebration"
-    END_SESSION = "end_session"
-    REQUEST_INPUT = "request_input"
+# Actions frontend should take
+UIAction = Literal[
+    "show_question",
+    "show_message",
+    "show_feedback",
+    "show_study_plan",
+    "show_progress",
+    "show_celebration",
+    "end_session",
+    "request_input",
+]
 
 
 class MessageResponse(BaseModel):
     """AI message to display"""
-    type: str = "message"
+    type: Literal["message"] = "message"
     content: str
     is_encouragement: bool = False
 
 
 class QuestionDisplay(BaseModel):
     """Question to display in UI"""
-    type: str = "question"
+    type: Literal["question"] = "question"
     question: QuestionUnion
     context_message: Optional[str] = None  # AI message before question
     show_hint_button: bool = True
@@ -100,7 +100,7 @@ class QuestionDisplay(BaseModel):
 
 class FeedbackDisplay(BaseModel):
     """Feedback after answer"""
-    type: str = "feedback"
+    type: Literal["feedback"] = "feedback"
     is_correct: bool
     partial_credit: float = 0
     message: str
@@ -110,18 +110,28 @@ class FeedbackDisplay(BaseModel):
     next_action: str  # next_question, retry, hint, next_concept, reteach
 
 
+class StudyPlanConcept(BaseModel):
+    """Single concept row in the study plan UI"""
+    id: str
+    name: str
+    description: str
+    difficulty: str
+    estimated_minutes: int
+    status: str
+
+
 class StudyPlanDisplay(BaseModel):
     """Study plan for UI"""
-    type: str = "study_plan"
+    type: Literal["study_plan"] = "study_plan"
     message: str
     total_concepts: int
     estimated_minutes: int
-    concepts: List[Dict[str, Any]]
+    concepts: List[StudyPlanConcept]
 
 
 class ProgressDisplay(BaseModel):
     """Progress update for UI"""
-    type: str = "progress"
+    type: Literal["progress"] = "progress"
     concepts_completed: int
     concepts_total: int
     current_concept: str
@@ -132,7 +142,7 @@ class ProgressDisplay(BaseModel):
 
 class CelebrationDisplay(BaseModel):
     """Celebration/achievement UI"""
-    type: str = "celebration"
+    type: Literal["celebration"] = "celebration"
     title: str
     message: str
     xp_earned: int
@@ -142,7 +152,7 @@ class CelebrationDisplay(BaseModel):
 
 class SessionSummary(BaseModel):
     """Session summary for wrap-up"""
-    type: str = "session_summary"
+    type: Literal["session_summary"] = "session_summary"
     duration_minutes: int
     concepts_covered: int
     concepts_mastered: int
@@ -153,6 +163,21 @@ class SessionSummary(BaseModel):
     next_session_preview: str
 
 
+# Any item that can appear in APIResponse.display, dispatched on `type`
+DisplayItem = Annotated[
+    Union[
+        MessageResponse,
+        QuestionDisplay,
+        FeedbackDisplay,
+        StudyPlanDisplay,
+        ProgressDisplay,
+        CelebrationDisplay,
+        SessionSummary
+    ],
+    Field(discriminator="type")
+]
+
+
 # ============ Main API Response ============
 
 class APIResponse(BaseModel):
@@ -162,13 +187,13 @@ class APIResponse(BaseModel):
     current_phase: CurrentPhase
     
     # What to display (can be multiple items)
-    display: List[Any]  # List of MessageResponse, QuestionDisplay, etc.
+    display: List[DisplayItem]
     
     # Current progress (always included)
     progress: Optional[ProgressDisplay] = None
     
     # Session metadata
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow)
     
     # Error info if any
     error: Optional[str] = None
@@ -184,6 +209,117 @@ class SessionCreatedResponse(BaseModel):
     chapter: str
 
 
+# ============ Session Detail (GET /session/{id}) ============
+
+class SessionDetailStats(BaseModel):
+    """Stats block of the session detail view"""
+    duration_minutes: int
+    questions_attempted: int
+    questions_correct: int
+    accuracy_rate: float
+    concepts_mastered: int
+    xp_earned: int
+
+
+class SessionDetailConcept(BaseModel):
+    """One study plan concept in the session detail view"""
+    id: str
+    name: str
+    status: ConceptStatus
+    mastery_score: float
+
+
+class SessionDetailStudyPlan(BaseModel):
+    """Study plan block of the session detail view"""
+    total_concepts: int
+    current_concept_index: int
+    concepts: List[SessionDetailConcept]
+
+
+class SessionDetailAssessment(BaseModel):
+    """Diagnostic result in the session detail view"""
+    level: str
+    score: float
+
+
+class SessionDetailDiagnostic(BaseModel):
+    """Diagnostic block of the session detail view"""
+    status: PhaseStatus
+    questions_asked: int
+    assessment: Optional[SessionDetailAssessment] = None
+
+
+class SessionDetail(BaseModel):
+    """Read-only projection of a Session returned by GET /session/{id}"""
+    session_id: str
+    student_id: str
+    student_name: str
+    status: SessionStatus
+    current_phase: CurrentPhase
+    subject: Optional[str] = None
+    chapter: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    stats: SessionDetailStats
+    study_plan: Optional[SessionDetailStudyPlan] = None
+    diagnostic: SessionDetailDiagnostic
+    
+    @classmethod
+    def from_session(cls, session: Session) -> "SessionDetail":
+        """Project a full session down to the detail view"""
+        stats = session.stats
+        plan = session.study_plan
+        diagnostic = session.diagnostic
+        assessment = diagnostic.assessment
+        
+        return cls(
+            session_id=session.session_id,
+            student_id=session.student_id,
+            student_name=session.student.name,
+            status=session.status,
+            current_phase=session.current_phase,
+            subject=session.meta.subject if session.meta else None,
+            chapter=session.meta.chapter if session.meta else None,
+            created_at=session.created_at,
+            updated_at=session.updated_at,
+            stats=SessionDetailStats(
+                duration_minutes=stats.duration_minutes,
+                questions_attempted=stats.questions_attempted,
+                questions_correct=stats.questions_correct,
+                accuracy_rate=stats.accuracy_rate,
+                concepts_mastered=stats.concepts_mastered,
+                xp_earned=stats.xp_earned
+            ),
+            study_plan=SessionDetailStudyPlan(
+                total_concepts=plan.total_concepts,
+                current_concept_index=plan.current_concept_index,
+                concepts=[
+                    SessionDetailConcept(
+                        id=c.concept_id,
+                        name=c.name,
+                        status=c.status,
+                        mastery_score=c.mastery_score
+                    )
+                    for c in plan.concepts
+                ]
+            ) if plan.concepts else None,
+            diagnostic=SessionDetailDiagnostic(
+                status=diagnostic.status,
+                questions_asked=len(diagnostic.questions),
+                assessment=SessionDetailAssessment(
+                    level=assessment.overall_level,
+                    score=assessment.score
+                ) if assessment else None
+            )
+        )
+
+
+class SessionDetailResponse(BaseModel):
+    """Response for GET /session/{id}"""
+    success: bool = True
+    session: SessionDetail
+
+
 class ErrorResponse(BaseModel):
     """Error response"""
     success: bool = False
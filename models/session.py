@@ -1,13 +1,20 @@
 """
 Session models for tracking student learning progress
 """
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator, field_serializer
+from typing import Optional, List, Dict, Any, Literal, Deque
+from collections import deque
+from datetime import datetime, timezone
 from enum import Enum
+from functools import partial
+import os
 import uuid
 
 
+# Timezone-aware replacement for the deprecated datetime.utcnow
+utcnow = partial(datetime.now, timezone.utc)
+
+
 class SessionStatus(str, Enum):
     ACTIVE = "active"
     PAUSED = "paused"
@@ -39,12 +46,9 @@ class LearningStyle(str, Enum):
     PRACTICE = "practice"
 
 
-class StudentMood(str, Enum):
-    ENGAGED = "engaged"
-    CONFUSED = "confused"
-    FRUSTRATED = "frustrated"
-    BORED = "bored"
-    EXCITED = "excited"
+StudentMood = Literal["engaged", "confused", "frustrated", "bored", "excited"]
+
+MessageRole = Literal["user", "assistant"]
 
 
 # ============ Student Profile Models ============
@@ -150,8 +154,10 @@ class StudyPlan(BaseModel):
 
 class TeachingLogEntry(BaseModel):
     """Single entry in teaching log"""
-    log_id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    model_config = ConfigDict(frozen=True, extra="forbid")  # Append-only, never mutated
+    
+    log_id: str = Field(default_factory=lambda: os.urandom(4).hex())
+    timestamp: datetime = Field(default_factory=utcnow)
     concept_id: str
     entry_type: str  # teaching, check_understanding, assessment, hint, retry, encouragement
     ai_message: str
@@ -167,19 +173,36 @@ class TeachingLogEntry(BaseModel):
 
 class Message(BaseModel):
     """Single message in conversation"""
-    role: str  # user, assistant
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    role: MessageRole
     content: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow)
+
+
+# Number of recent messages kept in conversation context
+MAX_RECENT_MESSAGES = 10
 
 
 class ConversationContext(BaseModel):
     """Conversation state and context"""
     total_messages: int = 0
-    recent_messages: List[Message] = []  # Keep last N messages
-    student_mood: StudentMood = StudentMood.ENGAGED
+    recent_messages: Deque[Message] = Field(
+        default_factory=lambda: deque(maxlen=MAX_RECENT_MESSAGES)
+    )  # Oldest messages drop off automatically on append
+    student_mood: StudentMood = "engaged"
     confusion_signals: int = 0
     frustration_signals: int = 0
     last_encouragement_at: Optional[datetime] = None
+    
+    @field_validator("recent_messages", mode="after")
+    @classmethod
+    def _bound_recent_messages(cls, value: Deque[Message]) -> Deque[Message]:
+        return deque(value, maxlen=MAX_RECENT_MESSAGES)
+    
+    @field_serializer("recent_messages")
+    def _serialize_recent_messages(self, value: Deque[Message]) -> List[Message]:
+        return list(value)
 
 
 # ============ Session Stats ============
@@ -189,12 +212,19 @@ class SessionStats(BaseModel):
     duration_minutes: int = 0
     questions_attempted: int = 0
     questions_correct: int = 0
-    accuracy_rate: float = 0
     hints_used: int = 0
     concepts_taught: int = 0
     concepts_mastered: int = 0
     xp_earned: int = 0
     streak_maintained: bool = True
+    
+    @computed_field
+    @property
+    def accuracy_rate(self) -> float:
+        """Share of attempted questions answered correctly (derived, never stored)"""
+        if not self.questions_attempted:
+            return 0.0
+        return self.questions_correct / self.questions_attempted
 
 
 # ============ AI Notes ============
@@ -235,8 +265,9 @@ class Session(BaseModel):
     # Identifiers
     session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+    version: int = 0  # bumped on every save (used for ETags)
     status: SessionStatus = SessionStatus.ACTIVE
     
     # Metadata
@@ -261,4 +292,11 @@ class Session(BaseModel):
     ai_notes: AINotes = Field(default_factory=AINotes)
     
     def update_timestamp(self):
-        self.updated_at = datetime.utcnow()
+        self.updated_at = utcnow()
+    
+    def elapsed_minutes(self) -> int:
+        """Whole minutes since the session was created"""
+        created = self.created_at
+        if created.tzinfo is None:  # files written before timestamps were tz-aware
+            created = created.replace(tzinfo=timezone.utc)
+        return int((utcnow() - created).total_seconds() / 60)
@@ -1,8 +1,13 @@
 """
 Chat Router - Endpoints for learning interactions
 """
+import asyncio
+import logging
+
+import orjson
 from fastapi import APIRouter, HTTPException
-from typing import Any
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Any, Awaitable, Callable, Dict
 
 from models import (
     SubmitAnswerRequest,
@@ -11,11 +16,76 @@ from models import (
     SkipConceptRequest,
     EndSessionRequest,
     APIResponse,
-    CurrentPhase
+    CurrentPhase,
+    ConceptStatus,
+    PhaseStatus,
+    Session
 )
 from services import tutor, session_manager
 
-router = APIRouter(prefix="/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/chat", tags=["Chat"], default_response_class=ORJSONResponse)
+
+
+async def _load_session_or_404(session_id: str) -> Session:
+    """Load a session once for the request, or raise 404 if it doesn't exist"""
+    session = await session_manager.aload_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+def _skip_current_concept(session: Session) -> None:
+    """Mark the current study plan concept as skipped and advance past it"""
+    if session.study_plan.concepts:
+        idx = session.study_plan.current_concept_index
+        if idx < len(session.study_plan.concepts):
+            session.study_plan.concepts[idx].status = ConceptStatus.SKIPPED
+            session.study_plan.current_concept_index += 1
+
+
+def _stream_llm_step(
+    session_id: str,
+    phase: CurrentPhase,
+    run: Callable[[Callable[[str], Awaitable[None]]], Awaitable[APIResponse]]
+) -> StreamingResponse:
+    """
+    Run an orchestrator step and stream it as Server-Sent Events
+    
+    `run` is called with an on_token callback; each text chunk it receives
+    goes out as `event: token`, then the step's APIResponse as `event: result`.
+    """
+    tokens: asyncio.Queue = asyncio.Queue()
+    
+    async def step() -> APIResponse:
+        try:
+            return await run(tokens.put)
+        finally:
+            await tokens.put(None)
+    
+    task = asyncio.create_task(step())
+    
+    async def events():
+        while True:
+            token = await tokens.get()
+            if token is None:
+                break
+            yield b"event: token\ndata: " + orjson.dumps(token) + b"\n\n"
+        
+        try:
+            response = await task
+        except Exception as e:
+            response = APIResponse(
+                success=False,
+                session_id=session_id,
+                current_phase=phase,
+                display=[],
+                error=f"Internal server error: {str(e)}"
+            )
+        yield b"event: result\ndata: " + response.model_dump_json().encode() + b"\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @router.post("/start-diagnostic", response_model=APIResponse)
@@ -27,10 +97,9 @@ async def start_diagnostic(session_id: str):
     Returns the first diagnostic question.
     """
     try:
-        if not session_manager.session_exists(session_id):
-            raise HTTPException(status_code=404, detail="Session not found")
+        session = await _load_session_or_404(session_id)
         
-        response = await tutor.start_diagnostic(session_id)
+        response = await tutor.start_diagnostic(session_id, session=session)
         
         if not response.success:
             raise HTTPException(status_code=500, detail=response.error)
@@ -40,9 +109,7 @@ async def start_diagnostic(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in start_diagnostic: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in start_diagnostic")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
@@ -59,10 +126,9 @@ async def submit_diagnostic_answer(
     or final assessment results.
     """
     try:
-        if not session_manager.session_exists(session_id):
-            raise HTTPException(status_code=404, detail="Session not found")
+        session = await _load_session_or_404(session_id)
         
-        response = await tutor.submit_diagnostic_answer(session_id, question_id, answer)
+        response = await tutor.submit_diagnostic_answer(session_id, question_id, answer, session=session)
         
         if not response.success:
             raise HTTPException(status_code=500, detail=response.error)
@@ -72,9 +138,7 @@ async def submit_diagnostic_answer(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in submit_diagnostic_answer: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in submit_diagnostic_answer")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
@@ -87,10 +151,9 @@ async def generate_study_plan(session_id: str):
     Should be called after diagnostic is complete.
     """
     try:
-        if not session_manager.session_exists(session_id):
-            raise HTTPException(status_code=404, detail="Session not found")
+        session = await _load_session_or_404(session_id)
         
-        response = await tutor.generate_study_plan(session_id)
+        response = await tutor.generate_study_plan(session_id, session=session)
         
         if not response.success:
             raise HTTPException(status_code=500, detail=response.error)
@@ -100,9 +163,7 @@ async def generate_study_plan(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in generate_study_plan: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in generate_study_plan")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
@@ -115,10 +176,9 @@ async def start_teaching(session_id: str):
     Returns teaching content and practice question.
     """
     try:
-        if not session_manager.session_exists(session_id):
-            raise HTTPException(status_code=404, detail="Session not found")
+        session = await _load_session_or_404(session_id)
         
-        response = await tutor.start_teaching_concept(session_id)
+        response = await tutor.start_teaching_concept(session_id, session=session)
         
         if not response.success:
             raise HTTPException(status_code=500, detail=response.error)
@@ -128,12 +188,29 @@ async def start_teaching(session_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in start_teaching: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in start_teaching")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.post("/start-teaching/stream")
+async def start_teaching_stream(session_id: str):
+    """
+    Start teaching the current concept, streamed as Server-Sent Events
+    
+    Same as /start-teaching, but the teaching text is forwarded as it is
+    generated:
+    - `event: token` - a JSON-encoded string, the next piece of teaching_content
+    - `event: result` - the final APIResponse (same body as /start-teaching)
+    """
+    session = await _load_session_or_404(session_id)
+    
+    return _stream_llm_step(
+        session_id,
+        CurrentPhase.TEACHING,
+        lambda on_token: tutor.start_teaching_concept(session_id, session=session, on_token=on_token)
+    )
+
+
 @router.post("/submit-answer", response_model=APIResponse)
 async def submit_answer(request: SubmitAnswerRequest):
     """
@@ -143,13 +220,13 @@ async def submit_answer(request: SubmitAnswerRequest):
     - Correct: Move to next question or concept
     - Wrong: Provide hint, allow retry, or reteach
     """
-    if not session_manager.session_exists(request.session_id):
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = await _load_session_or_404(request.session_id)
     
     response = await tutor.submit_practice_answer(
         request.session_id,
         request.question_id,
-        request.answer
+        request.answer,
+        session=session
     )
     
     if not response.success:
@@ -166,10 +243,9 @@ async def get_hint(request: RequestHintRequest):
     Returns a helpful hint without giving away the answer.
     Tracks hint usage in session stats.
     """
-    if not session_manager.session_exists(request.session_id):
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = await _load_session_or_404(request.session_id)
     
-    response = await tutor.get_hint(request.session_id, request.question_id)
+    response = await tutor.get_hint(request.session_id, request.question_id, session=session)
     
     return response
 
@@ -182,21 +258,12 @@ async def skip_concept(request: SkipConceptRequest):
     Allows student to skip a concept they find too difficult.
     Marks concept for review and moves to next.
     """
-    if not session_manager.session_exists(request.session_id):
+    session = await session_manager.amutate(request.session_id, _skip_current_concept)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = session_manager.load_session(request.session_id)
-    
-    if session.study_plan.concepts:
-        idx = session.study_plan.current_concept_index
-        if idx < len(session.study_plan.concepts):
-            from models import ConceptStatus
-            session.study_plan.concepts[idx].status = ConceptStatus.SKIPPED
-            session.study_plan.current_concept_index += 1
-            session_manager.save_session(session)
-    
     # Start next concept or wrap up
-    response = await tutor.start_teaching_concept(request.session_id)
+    response = await tutor.start_teaching_concept(request.session_id, session=session)
     
     return response
 
@@ -208,14 +275,32 @@ async def end_session(request: EndSessionRequest):
     
     Wraps up the session with a summary of progress and achievements.
     """
-    if not session_manager.session_exists(request.session_id):
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = await _load_session_or_404(request.session_id)
     
-    response = await tutor.wrap_up_session(request.session_id)
+    response = await tutor.wrap_up_session(request.session_id, session=session)
     
     return response
 
 
+@router.post("/end-session/stream")
+async def end_session_stream(request: EndSessionRequest):
+    """
+    End the current session, streamed as Server-Sent Events
+    
+    Same as /end-session, but the celebration message is forwarded as it
+    is generated:
+    - `event: token` - a JSON-encoded string, the next piece of celebration_message
+    - `event: result` - the final APIResponse (same body as /end-session)
+    """
+    session = await _load_session_or_404(request.session_id)
+    
+    return _stream_llm_step(
+        request.session_id,
+        CurrentPhase.WRAPUP,
+        lambda on_token: tutor.wrap_up_session(request.session_id, session=session, on_token=on_token)
+    )
+
+
 @router.post("/message")
 async def send_message(request: SendMessageRequest):
     """
@@ -224,14 +309,13 @@ async def send_message(request: SendMessageRequest):
     For general chat interactions outside the structured flow.
     Can be used for questions, clarifications, etc.
     """
-    if not session_manager.session_exists(request.session_id):
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session = session_manager.load_session(request.session_id)
-    
     # Add message to conversation
-    session = session_manager.add_message(session, "user", request.message)
-    session_manager.save_session(session)
+    session = await session_manager.amutate(
+        request.session_id,
+        lambda s: session_manager.add_message(s, "user", request.message)
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     
     # For MVP, route to appropriate handler based on current phase
     if session.current_phase == CurrentPhase.DIAGNOSTIC:
@@ -241,7 +325,8 @@ async def send_message(request: SendMessageRequest):
             return await tutor.submit_diagnostic_answer(
                 request.session_id,
                 last_q.question_id,
-                request.message
+                request.message,
+                session=session
             )
     
     elif session.current_phase == CurrentPhase.TEACHING:
@@ -249,7 +334,8 @@ async def send_message(request: SendMessageRequest):
         return await tutor.submit_practice_answer(
             request.session_id,
             "current",
-            request.message
+            request.message,
+            session=session
         )
     
     # Default response
@@ -266,6 +352,17 @@ async def send_message(request: SendMessageRequest):
 
 # ============ Convenience Endpoints ============
 
+# What /next does in each phase (DIAGNOSTIC is handled inline in next_step)
+_NEXT_STEP_BY_PHASE: Dict[CurrentPhase, Callable[..., Awaitable[APIResponse]]] = {
+    CurrentPhase.TOPIC_SELECTION: tutor.start_diagnostic,
+    CurrentPhase.PLAN_GENERATION: tutor.generate_study_plan,
+    CurrentPhase.TEACHING: tutor.start_teaching_concept,
+    CurrentPhase.RETEACH: tutor.start_teaching_concept,
+    CurrentPhase.ASSESSMENT: tutor.start_teaching_concept,
+    CurrentPhase.WRAPUP: tutor.wrap_up_session,
+}
+
+
 @router.post("/next")
 async def next_step(session_id: str):
     """
@@ -274,39 +371,26 @@ async def next_step(session_id: str):
     Automatically determines and executes the next action based on
     current session state. Useful for "Continue" button.
     """
-    if not session_manager.session_exists(session_id):
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = await _load_session_or_404(session_id)
     
-    session = session_manager.load_session(session_id)
+    # Diagnostic is the only phase whose next step depends on more than the phase
+    if session.current_phase == CurrentPhase.DIAGNOSTIC:
+        if session.diagnostic.status == PhaseStatus.COMPLETED:
+            return await tutor.generate_study_plan(session_id, session=session)
+        # Continue diagnostic (shouldn't reach here normally)
+        return await tutor.start_diagnostic(session_id, session=session)
     
     # Route based on current phase
-    if session.current_phase == CurrentPhase.TOPIC_SELECTION:
-        return await tutor.start_diagnostic(session_id)
-    
-    elif session.current_phase == CurrentPhase.DIAGNOSTIC:
-        # Check if diagnostic is complete
-        if session.diagnostic.status.value == "completed":
-            return await tutor.generate_study_plan(session_id)
-        else:
-            # Continue diagnostic (shouldn't reach here normally)
-            return await tutor.start_diagnostic(session_id)
-    
-    elif session.current_phase == CurrentPhase.PLAN_GENERATION:
-        return await tutor.generate_study_plan(session_id)
-    
-    elif session.current_phase in [CurrentPhase.TEACHING, CurrentPhase.RETEACH, CurrentPhase.ASSESSMENT]:
-        return await tutor.start_teaching_concept(session_id)
-    
-    elif session.current_phase == CurrentPhase.WRAPUP:
-        return await tutor.wrap_up_session(session_id)
-    
-    else:
-        return APIResponse(
-            success=True,
-            session_id=session_id,
-            current_phase=session.current_phase,
-            display=[{
-                "type": "message",
-                "content": "Let's continue learning!"
-            }]
-        )
+    handler = _NEXT_STEP_BY_PHASE.get(session.current_phase)
+    if handler is not None:
+        return await handler(session_id, session=session)
+    
+    return APIResponse(
+        success=True,
+        session_id=session_id,
+        current_phase=session.current_phase,
+        display=[{
+            "type": "message",
+            "content": "Let's continue learning!"
+        }]
+    )
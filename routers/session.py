@@ -1,7 +1,8 @@
 """
 Session Router - Endpoints for session management
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import ORJSONResponse, Response
 from typing import List, Optional
 
 from models import (
@@ -9,15 +10,16 @@ from models import (
     SessionCreatedResponse,
     ErrorResponse,
     Session,
+    SessionDetailResponse,
     CurrentPhase
 )
 from services import session_manager
 
-router = APIRouter(prefix="/session", tags=["Session"])
+router = APIRouter(prefix="/session", tags=["Session"], default_response_class=ORJSONResponse)
 
 
 @router.post("/create", response_model=SessionCreatedResponse)
-async def create_session(request: CreateSessionRequest):
+def create_session(request: CreateSessionRequest):
     """
     Create a new tutoring session
     
@@ -51,81 +53,48 @@ async def create_session(request: CreateSessionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{session_id}")
-async def get_session(session_id: str):
+@router.get("/{session_id}", response_model=SessionDetailResponse)
+def get_session(session_id: str):
     """
     Get session details
     
     Returns the full session state including progress, current phase,
     and all session data.
     """
-    session = session_manager.load_session(session_id)
+    body = session_manager.load_session_detail(session_id)
     
-    if not session:
+    if body is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    return {
-        "success": True,
-        "session": {
-            "session_id": session.session_id,
-            "student_id": session.student_id,
-            "student_name": session.student.name,
-            "status": session.status.value,
-            "current_phase": session.current_phase.value,
-            "subject": session.meta.subject if session.meta else None,
-            "chapter": session.meta.chapter if session.meta else None,
-            "created_at": session.created_at,
-            "updated_at": session.updated_at,
-            "stats": {
-                "duration_minutes": session.stats.duration_minutes,
-                "questions_attempted": session.stats.questions_attempted,
-                "questions_correct": session.stats.questions_correct,
-                "accuracy_rate": session.stats.accuracy_rate,
-                "concepts_mastered": session.stats.concepts_mastered,
-                "xp_earned": session.stats.xp_earned
-            },
-            "study_plan": {
-                "total_concepts": session.study_plan.total_concepts,
-                "current_concept_index": session.study_plan.current_concept_index,
-                "concepts": [
-                    {
-                        "id": c.concept_id,
-                        "name": c.name,
-                        "status": c.status.value,
-                        "mastery_score": c.mastery_score
-                    }
-                    for c in session.study_plan.concepts
-                ]
-            } if session.study_plan.concepts else None,
-            "diagnostic": {
-                "status": session.diagnostic.status.value,
-                "questions_asked": len(session.diagnostic.questions),
-                "assessment": {
-                    "level": session.diagnostic.assessment.overall_level,
-                    "score": session.diagnostic.assessment.score
-                } if session.diagnostic.assessment else None
-            }
-        }
-    }
+    # Pre-rendered SessionDetailResponse JSON, cached until the session changes
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/{session_id}/progress")
-async def get_progress(session_id: str):
+def get_progress(session_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Get session progress summary
     
     Returns a lightweight progress summary for UI updates.
+    Supports If-None-Match, so polling clients get a bodyless 304
+    while the session is unchanged.
     """
     session = session_manager.load_session(session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    etag = f'"{session.session_id}-{session.version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    
     current_concept = "Getting started"
     if session.study_plan.concepts and session.study_plan.current_concept_index < len(session.study_plan.concepts):
         current_concept = session.study_plan.concepts[session.study_plan.current_concept_index].name
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "progress": {
             "current_phase": session.current_phase.value,
@@ -137,11 +106,11 @@ async def get_progress(session_id: str):
             "questions_attempted": session.stats.questions_attempted,
             "questions_correct": session.stats.questions_correct
         }
-    }
+    }, headers=headers)
 
 
 @router.get("/list/{student_id}")
-async def list_sessions(student_id: str):
+def list_sessions(student_id: str):
     """
     List all sessions for a student
     
@@ -157,7 +126,7 @@ async def list_sessions(student_id: str):
 
 
 @router.delete("/{session_id}")
-async def delete_session(session_id: str):
+def delete_session(session_id: str):
     """
     Delete a session
     
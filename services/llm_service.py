@@ -1,22 +1,202 @@
 """
 LLM Service - Groq API integration
 """
-import json
+import asyncio
+import copy
+import hashlib
+import logging
 import re
-from typing import Optional, Dict, Any
-from groq import Groq
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, List, Tuple, Union
+import httpx
+import orjson
+from groq import APIError, Groq, AsyncGroq, DefaultAsyncHttpxClient, Omit, omit
 
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+# Failures of the Groq round trip itself. httpx errors raised while a streamed
+# response is being read reach us unwrapped by the SDK.
+_REQUEST_ERRORS = (APIError, httpx.HTTPError)
+
+
+# JSON extraction pattern, compiled once for every LLM response
+_FENCED_JSON_RE = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+
+
+def _iter_balanced_json(text: str) -> Iterator[str]:
+    """Yield each top-level brace-balanced `{...}` substring of text
+    
+    Single linear pass (no regex backtracking). Braces inside JSON strings
+    are ignored, and prose before, between or after objects is skipped.
+    """
+    depth = 0
+    start = 0
+    in_string = False
+    escaped = False
+    
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif depth:
+            if ch == '"':
+                in_string = True
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    yield text[start:i + 1]
+
+
+# A run of JSON string characters that need no unescaping
+_PLAIN_STRING_RUN_RE = re.compile(r'[^"\\]+')
+
+
+def _escape_length(text: str, pos: int) -> Optional[int]:
+    """Length of the JSON escape starting at text[pos], or None if it is cut off
+
+    A `\\uXXXX` high surrogate takes its low-surrogate escape with it, so a
+    pair split across chunks is decoded as one character.
+    """
+    if pos + 2 > len(text):
+        return None
+    if text[pos + 1] != "u":
+        return 2
+    if pos + 6 > len(text):
+        return None
+
+    try:
+        high_surrogate = 0xD800 <= int(text[pos + 2:pos + 6], 16) <= 0xDBFF
+    except ValueError:
+        return 6
+    if not high_surrogate:
+        return 6
+
+    follower = text[pos + 6:pos + 8]
+    if follower != "\\u"[:len(follower)]:
+        return 6
+    if pos + 12 > len(text):
+        return None
+    return 12
+
+
+class JsonFieldStream:
+    """on_token wrapper that forwards only one string field of a JSON reply
+
+    Raw chunks of `{..., "field": "...", ...}` go in; the unescaped text of
+    that field's value comes out as it arrives. Everything before the value
+    and after its closing quote is dropped, and malformed escapes are skipped.
+    """
+
+    def __init__(self, field: str, on_token: Callable[[str], Awaitable[None]]):
+        self._value_start_re = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._on_token = on_token
+        self._buffer = ""
+        self._in_value = False
+        self._done = False
+
+    async def __call__(self, chunk: str) -> None:
+        if self._done:
+            return
+
+        self._buffer += chunk
+        if not self._in_value:
+            match = self._value_start_re.search(self._buffer)
+            if match is None:
+                return
+            self._buffer = self._buffer[match.end():]
+            self._in_value = True
+
+        text = self._decode_available()
+        if text:
+            await self._on_token(text)
+
+    def _decode_available(self) -> str:
+        """Decode the buffered value up to its end or the first cut-off escape"""
+        buffer = self._buffer
+        pieces = []
+        pos = 0
+
+        while pos < len(buffer):
+            if buffer[pos] == '"':
+                self._done = True
+                break
+
+            if buffer[pos] != "\\":
+                run = _PLAIN_STRING_RUN_RE.match(buffer, pos)
+                pieces.append(run.group())
+                pos = run.end()
+                continue
+
+            length = _escape_length(buffer, pos)
+            if length is None:
+                break
+            try:
+                pieces.append(orjson.loads('"' + buffer[pos:pos + length] + '"'))
+            except orjson.JSONDecodeError:
+                pass
+            pos += length
+
+        self._buffer = "" if self._done else buffer[pos:]
+        return "".join(pieces)
+
+
+class _ResponseCache:
+    """Bounded LRU of successful LLM results with per-entry expiry
+    
+    Values are deep-copied in and out so callers can never mutate a cached entry.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+    
+    def put(self, key: bytes, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
 
 class LLMService:
     """Handles all LLM interactions via Groq API"""
     
     def __init__(self):
         self.client = None
+        self.async_client = None
         self.model = settings.LLM_MODEL
         self.temperature = settings.LLM_TEMPERATURE
         self.max_tokens = settings.LLM_MAX_TOKENS
+        self.json_mode = settings.LLM_JSON_MODE
+        
+        # Response cache for near-deterministic (low temperature) calls
+        self.cache_max_temperature = settings.LLM_CACHE_MAX_TEMPERATURE
+        self._cache = _ResponseCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS)
+        self._inflight: Dict[bytes, asyncio.Future] = {}
     
     def _get_client(self) -> Groq:
         """Get or create Groq client
@@ -34,100 +214,304 @@ class LLMService:
             self.client = Groq(api_key=settings.GROQ_API_KEY)
         return self.client
     
+    def _new_async_client(self) -> AsyncGroq:
+        """Build an AsyncGroq client with a sized, keep-alive connection pool"""
+        if not settings.GROQ_API_KEY:
+            raise ValueError("GROQ_API_KEY not set in environment")
+        return AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=DefaultAsyncHttpxClient(
+                http2=settings.LLM_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                )
+            ),
+        )
+    
+    def _get_async_client(self) -> AsyncGroq:
+        """Get or create the async Groq client used by the awaitable methods
+        
+        Keeps `generate`/`generate_with_history` from blocking the event loop
+        while waiting on the Groq API. Normally created once by `start()`.
+        """
+        if self.async_client is None:
+            self.async_client = self._new_async_client()
+        return self.async_client
+    
+    def start(self) -> None:
+        """Create the shared async client at app startup so its pool is reused by every request"""
+        if self.async_client is None and settings.GROQ_API_KEY:
+            self.async_client = self._new_async_client()
+    
+    async def aclose(self) -> None:
+        """Close the Groq clients and their connection pools at app shutdown"""
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+    
     def _extract_json(self, text: str) -> Optional[Dict[str, Any]]:
         """Extract JSON from LLM response"""
-        # Try to find JSON block in markdown code blocks
-        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
-        if json_match:
+        # No brace anywhere means no JSON object (plain prose reply)
+        if "{" not in text:
+            return None
+        
+        # Pure JSON (the norm with JSON mode) parses directly, no scanning needed
+        if text.lstrip().startswith("{"):
             try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
+                return orjson.loads(text)
+            except orjson.JSONDecodeError:
                 pass
         
-        # Try to find raw JSON object
-        json_match = re.search(r'\{[\s\S]*\}', text)
+        # Try to find JSON block in markdown code blocks
+        json_match = _FENCED_JSON_RE.search(text)
         if json_match:
             try:
-                return json.loads(json_match.group(0))
-            except json.JSONDecodeError:
+                return orjson.loads(json_match.group(1))
+            except orjson.JSONDecodeError:
                 pass
         
-        # Try parsing the entire text as JSON
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
+        # Try each balanced raw JSON object in turn
+        for candidate in _iter_balanced_json(text):
+            try:
+                return orjson.loads(candidate)
+            except orjson.JSONDecodeError:
+                pass
         
         return None
     
+    def _response_format(self, expect_json: bool) -> Union[Dict[str, str], Omit]:
+        """Ask Groq for a bare JSON object when the caller will parse one"""
+        if expect_json and self.json_mode:
+            return {"type": "json_object"}
+        return omit
+    
+    def _cache_key(
+        self,
+        prompt: str,
+        user_message: Optional[str],
+        expect_json: bool,
+        temperature: float,
+        max_tokens: int
+    ) -> bytes:
+        """Hash everything that influences the completion into a cache key"""
+        key = "\x1f".join((
+            self.model,
+            repr(temperature),
+            str(max_tokens),
+            "json" if expect_json else "text",
+            prompt,
+            user_message or "",
+        ))
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    
     async def generate(
         self,
         prompt: str,
         user_message: Optional[str] = None,
         expect_json: bool = True,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         Generate a response from the LLM
         
+        Calls at or below LLM_CACHE_MAX_TEMPERATURE are served from an in-memory
+        cache, and identical calls already in flight share one Groq request.
+        
         Args:
             prompt: System prompt with instructions
             user_message: Optional user message to respond to
             expect_json: Whether to parse response as JSON
             temperature: Override default temperature
             max_tokens: Override default max tokens
+            on_token: Optional callback awaited with each streamed text chunk
+                (streamed calls bypass the cache)
         
         Returns:
             Dict with 'success', 'response' (parsed JSON or text), and 'raw_response'
         """
-        try:
-            client = self._get_client()
-            
-            messages = [{"role": "system", "content": prompt}]
-            
-            if user_message:
-                messages.append({"role": "user", "content": user_message})
-            else:
-                # If no user message, add a simple prompt to get started
-                messages.append({"role": "user", "content": "Please proceed."})
-            
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or self.max_tokens,
+        temperature = self.temperature if temperature is None else temperature
+        max_tokens = max_tokens or self.max_tokens
+        
+        if on_token is not None or temperature > self.cache_max_temperature:
+            return await self._call(
+                self._build_messages(prompt, user_message), expect_json, temperature, max_tokens, on_token
             )
-            
-            raw_response = response.choices[0].message.content
-            
-            if expect_json:
-                parsed = self._extract_json(raw_response)
-                if parsed:
-                    return {
-                        "success": True,
-                        "response": parsed,
-                        "raw_response": raw_response
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "Failed to parse JSON from response",
-                        "raw_response": raw_response
-                    }
-            else:
-                return {
-                    "success": True,
-                    "response": raw_response,
-                    "raw_response": raw_response
-                }
         
+        key = self._cache_key(prompt, user_message, expect_json, temperature, max_tokens)
+        
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return copy.deepcopy(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # this caller was cancelled, not the shared call
+                # The request that owned the call went away; make our own
+                return await self.generate(prompt, user_message, expect_json, temperature, max_tokens)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._call(
+                self._build_messages(prompt, user_message), expect_json, temperature, max_tokens
+            )
+            if result["success"]:
+                self._cache.put(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
         except Exception as e:
+            # Waiters re-raise the same error; mark it retrieved so an
+            # unawaited future doesn't log "exception was never retrieved"
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+    
+    async def generate_many(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run several independent `generate` calls concurrently
+        
+        Args:
+            requests: Keyword arguments for each `generate` call
+        
+        Returns:
+            One result dict per request, in the same order as `requests`
+        """
+        return list(await asyncio.gather(*(self.generate(**request) for request in requests)))
+    
+    def _build_messages(self, prompt: str, user_message: Optional[str]) -> List[Dict[str, str]]:
+        """System prompt plus the user turn (a neutral nudge if there is none)"""
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": user_message or "Please proceed."},
+        ]
+    
+    def _build_result(self, raw_response: str, expect_json: bool) -> Dict[str, Any]:
+        """Wrap raw model output in the standard result dict"""
+        if not expect_json:
+            return {
+                "success": True,
+                "response": raw_response,
+                "raw_response": raw_response
+            }
+        
+        parsed = self._extract_json(raw_response)
+        if parsed:
             return {
-                "success": False,
-                "error": str(e),
-                "raw_response": None
+                "success": True,
+                "response": parsed,
+                "raw_response": raw_response
             }
+        
+        return {
+            "success": False,
+            "error": "Failed to parse JSON from response",
+            "raw_response": raw_response
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result dict for a failed Groq request"""
+        logger.warning("Groq request failed: %s", error)
+        return {
+            "success": False,
+            "error": str(error),
+            "raw_response": None
+        }
+    
+    async def _call(
+        self,
+        messages: List[Dict[str, str]],
+        expect_json: bool,
+        temperature: float,
+        max_tokens: int,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Single Groq round trip shared by the awaitable methods
+        
+        Only request failures become error results; bugs in our own
+        parsing propagate instead of being returned as strings.
+        """
+        try:
+            client = self._get_async_client()
+        except ValueError as e:  # GROQ_API_KEY is not set
+            return self._error_result(e)
+        
+        try:
+            if on_token is not None:
+                chunks = []
+                async for chunk in self._stream(client, messages, temperature, max_tokens):
+                    chunks.append(chunk)
+                    await on_token(chunk)
+                raw_response = "".join(chunks)
+            else:
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    response_format=self._response_format(expect_json),
+                )
+                raw_response = response.choices[0].message.content or ""
+        except _REQUEST_ERRORS as e:
+            return self._error_result(e)
+        
+        return self._build_result(raw_response, expect_json)
+    
+    async def _stream(
+        self,
+        client: AsyncGroq,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Yield non-empty text chunks of a streamed completion"""
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        
+        async for chunk in response:
+            if chunk.choices:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+    
+    async def stream(
+        self,
+        prompt: str,
+        user_message: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the completion text from Groq as it is generated
+        
+        Yields non-empty text chunks; errors propagate to the caller.
+        """
+        async for chunk in self._stream(
+            self._get_async_client(),
+            self._build_messages(prompt, user_message),
+            self.temperature if temperature is None else temperature,
+            max_tokens or self.max_tokens,
+        ):
+            yield chunk
     
     def generate_sync(
         self,
@@ -142,50 +526,21 @@ class LLMService:
         """
         try:
             client = self._get_client()
-            
-            messages = [{"role": "system", "content": prompt}]
-            
-            if user_message:
-                messages.append({"role": "user", "content": user_message})
-            else:
-                messages.append({"role": "user", "content": "Please proceed."})
-            
+        except ValueError as e:  # GROQ_API_KEY is not set
+            return self._error_result(e)
+        
+        try:
             response = client.chat.completions.create(
                 model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
+                messages=self._build_messages(prompt, user_message),
+                temperature=self.temperature if temperature is None else temperature,
                 max_tokens=max_tokens or self.max_tokens,
+                response_format=self._response_format(expect_json),
             )
-            
-            raw_response = response.choices[0].message.content
-            
-            if expect_json:
-                parsed = self._extract_json(raw_response)
-                if parsed:
-                    return {
-                        "success": True,
-                        "response": parsed,
-                        "raw_response": raw_response
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "Failed to parse JSON from response",
-                        "raw_response": raw_response
-                    }
-            else:
-                return {
-                    "success": True,
-                    "response": raw_response,
-                    "raw_response": raw_response
-                }
+        except _REQUEST_ERRORS as e:
+            return self._error_result(e)
         
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "raw_response": None
-            }
+        return self._build_result(response.choices[0].message.content or "", expect_json)
     
     async def generate_with_history(
         self,
@@ -203,50 +558,11 @@ class LLMService:
             user_message: Current user message
             expect_json: Whether to parse as JSON
         """
-        try:
-            client = self._get_client()
-            
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(conversation_history)
-            messages.append({"role": "user", "content": user_message})
-            
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-            )
-            
-            raw_response = response.choices[0].message.content
-            
-            if expect_json:
-                parsed = self._extract_json(raw_response)
-                if parsed:
-                    return {
-                        "success": True,
-                        "response": parsed,
-                        "raw_response": raw_response
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "Failed to parse JSON",
-                        "raw_response": raw_response
-                    }
-            
-            return {
-                "success": True,
-                "response": raw_response,
-                "raw_response": raw_response
-            }
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(conversation_history)
+        messages.append({"role": "user", "content": user_message})
         
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "raw_response": None
-            }
-
+        return await self._call(messages, expect_json, self.temperature, self.max_tokens)
 
 # Singleton instance
 llm_service = LLMService()
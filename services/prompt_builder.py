@@ -1,8 +1,9 @@
 """
 Prompt Builder - Creates prompts for different phases
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from functools import lru_cache
+from itertools import islice
 
 from models import (
     Session, CurrentPhase, LearningStyle, ConceptPlan,
@@ -45,9 +46,18 @@ class PromptBuilder:
 - Use complex vocabulary unnecessarily
 - Go off-topic or discuss non-educational content"""
 
-    # ============ Student Context Template ============
+    # Speaker labels used when replaying recent conversation
+    ROLE_LABELS: Dict[str, str] = {"user": "Student", "assistant": "Buddy"}
     
-    STUDENT_CONTEXT_TEMPLATE = """
+    # Free-text answers are the only unbounded input that reaches a prompt
+    # (replayed messages are already clipped to 200 chars), so cap them here
+    MAX_ANSWER_CHARS = 1000
+    
+    # ============ Student Context Templates ============
+    
+    # Profile only changes if the student or session metadata does, so
+    # BASE_PERSONA + profile is a stable prefix shared by every prompt of a session
+    STUDENT_PROFILE_TEMPLATE = """
 ## Student Profile
 - Name: {name}
 - Class: {class_grade}
@@ -66,7 +76,10 @@ class PromptBuilder:
 
 ## Known Weaknesses
 {weaknesses}
+"""
 
+    # Progress changes as the session goes on, so it comes after the prefix
+    PROGRESS_TEMPLATE = """
 ## Today's Progress
 - Concepts covered: {concepts_covered}/{total_concepts}
 - Current accuracy: {accuracy}%
@@ -409,44 +422,94 @@ Test whether {name} has mastered: {concept_name}
 
     # ============ Builder Methods ============
     
-    def build_student_context(self, session: Session) -> str:
-        """Build student context from session"""
-        style = session.student.preferences.learning_style
-        style_desc = self.STYLE_DESCRIPTIONS.get(style, self.STYLE_DESCRIPTIONS["examples"])
+    def _profile_key(self, session: Session) -> Tuple:
+        """Everything the student profile block depends on (hashable)"""
+        student = session.student
+        meta = session.meta
+        return (
+            student.name,
+            student.class_grade,
+            student.board,
+            student.preferences.learning_style,
+            student.preferences.pace,
+            tuple(student.interests),
+            meta.subject if meta else "Mathematics",
+            meta.chapter if meta else "General",
+            meta.topic_requested if meta else "General",
+            tuple(student.known_weaknesses),
+        )
+    
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _render_profile(
+        cls, name, class_grade, board, style, pace, interests, subject, chapter, topic, weaknesses
+    ) -> str:
+        return cls.STUDENT_PROFILE_TEMPLATE.format(
+            name=name,
+            class_grade=class_grade,
+            board=board,
+            learning_style=style,
+            style_description=cls.STYLE_DESCRIPTIONS.get(style, cls.STYLE_DESCRIPTIONS["examples"]),
+            pace=pace,
+            interests=", ".join(interests) or "general topics",
+            subject=subject,
+            chapter=chapter,
+            topic=topic,
+            weaknesses=", ".join(weaknesses) or "None identified yet"
+        )
+    
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _render_system_prefix(cls, *profile_key) -> str:
+        return cls.BASE_PERSONA + "\n" + cls._render_profile(*profile_key)
+    
+    def build_system_prefix(self, session: Session) -> str:
+        """
+        Build persona + student profile
         
-        concepts_covered = session.study_plan.current_concept_index
-        total_concepts = session.study_plan.total_concepts or 1
+        Identical for every prompt in a session (memoized), so providers
+        that cache prompt prefixes can reuse it across calls.
+        """
+        return self._render_system_prefix(*self._profile_key(session))
+    
+    def build_progress_context(self, session: Session) -> str:
+        """Build the per-call progress block that follows the system prefix"""
+        # Nothing to report before the first answer or study plan
+        if not session.study_plan.total_concepts and not session.stats.questions_attempted:
+            return ""
         
-        return self.STUDENT_CONTEXT_TEMPLATE.format(
-            name=session.student.name,
-            class_grade=session.student.class_grade,
-            board=session.student.board,
-            learning_style=style,
-            style_description=style_desc,
-            pace=session.student.preferences.pace,
-            interests=", ".join(session.student.interests) or "general topics",
-            subject=session.meta.subject if session.meta else "Mathematics",
-            chapter=session.meta.chapter if session.meta else "General",
-            topic=session.meta.topic_requested if session.meta else "General",
-            weaknesses=", ".join(session.student.known_weaknesses) or "None identified yet",
-            concepts_covered=concepts_covered,
-            total_concepts=total_concepts,
+        return self.PROGRESS_TEMPLATE.format(
+            concepts_covered=session.study_plan.current_concept_index,
+            total_concepts=session.study_plan.total_concepts or 1,
             accuracy=int(session.stats.accuracy_rate * 100)
         )
     
+    def _assemble(self, session: Session, instructions: str, context: str = "") -> str:
+        """Join prefix, progress, phase instructions and conversation in one pass"""
+        return "".join((
+            self.build_system_prefix(session),
+            self.build_progress_context(session),
+            "\n",
+            instructions,
+            context,
+        ))
+    
+    def build_student_context(self, session: Session) -> str:
+        """Build student context from session"""
+        return self._render_profile(*self._profile_key(session)) + self.build_progress_context(session)
+    
     def build_conversation_context(self, session: Session, max_messages: int = 5) -> str:
         """Build recent conversation context"""
         if not session.conversation.recent_messages:
             return ""
         
-        messages = session.conversation.recent_messages[-max_messages:]
-        context = "\n## Recent Conversation\n"
+        recent = session.conversation.recent_messages
+        messages = islice(recent, max(0, len(recent) - max_messages), None)
         
-        for msg in messages:
-            role = "Student" if msg.role == "user" else "Buddy"
-            context += f"[{role}]: {msg.content[:200]}...\n" if len(msg.content) > 200 else f"[{role}]: {msg.content}\n"
-        
-        return context
+        return "\n## Recent Conversation\n" + "".join(
+            f"[{self.ROLE_LABELS[msg.role]}]: {msg.content[:200]}{'...' if len(msg.content) > 200 else ''}\n"
+            for msg in messages
+        )
     
     def build_diagnostic_prompt(
         self, 
@@ -455,8 +518,6 @@ Test whether {name} has mastered: {concept_name}
         is_first: bool = False
     ) -> str:
         """Build prompt for diagnostic question"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.DIAGNOSTIC_INSTRUCTIONS.format(
             name=session.student.name,
             topic=session.meta.topic_requested if session.meta else "the topic",
@@ -464,7 +525,7 @@ Test whether {name} has mastered: {concept_name}
             is_first="true" if is_first else "false"
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
     
     def build_diagnostic_eval_prompt(
         self,
@@ -475,10 +536,8 @@ Test whether {name} has mastered: {concept_name}
         questions_asked: int
     ) -> str:
         """Build prompt for evaluating diagnostic answer"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.DIAGNOSTIC_EVALUATION_INSTRUCTIONS.format(
-            student_answer=student_answer,
+            student_answer=student_answer[:self.MAX_ANSWER_CHARS],
             correct_answer=correct_answer,
             concept_tested=concept_tested,
             questions_asked=questions_asked,
@@ -487,12 +546,10 @@ Test whether {name} has mastered: {concept_name}
         
         context = self.build_conversation_context(session)
         
-        return system + "\n" + instructions + context
+        return self._assemble(session, instructions, context)
     
     def build_study_plan_prompt(self, session: Session) -> str:
         """Build prompt for generating study plan"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         assessment = session.diagnostic.assessment
         
         instructions = self.STUDY_PLAN_INSTRUCTIONS.format(
@@ -503,12 +560,10 @@ Test whether {name} has mastered: {concept_name}
             chapter=session.meta.chapter if session.meta else "General"
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
     
     def build_teaching_prompt(self, session: Session, concept: ConceptPlan) -> str:
         """Build prompt for teaching a concept"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.TEACHING_INSTRUCTIONS.format(
             name=session.student.name,
             concept_name=concept.name,
@@ -521,7 +576,7 @@ Test whether {name} has mastered: {concept_name}
         
         context = self.build_conversation_context(session)
         
-        return system + "\n" + instructions + context
+        return self._assemble(session, instructions, context)
     
     def build_answer_eval_prompt(
         self,
@@ -534,12 +589,10 @@ Test whether {name} has mastered: {concept_name}
         hints_given: int
     ) -> str:
         """Build prompt for evaluating practice answer"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.ANSWER_EVALUATION_INSTRUCTIONS.format(
             concept_name=concept.name,
             question_text=question_text,
-            student_answer=student_answer,
+            student_answer=student_answer[:self.MAX_ANSWER_CHARS],
             correct_answer=correct_answer,
             attempt_number=attempt_number,
             hints_given=hints_given,
@@ -547,19 +600,17 @@ Test whether {name} has mastered: {concept_name}
             next_num=attempt_number + 1
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
     
     def build_assessment_prompt(self, session: Session, concept: ConceptPlan) -> str:
         """Build prompt for concept assessment"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.ASSESSMENT_INSTRUCTIONS.format(
             name=session.student.name,
             concept_name=concept.name,
             concept_id=concept.concept_id
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
     
     def build_reteach_prompt(
         self,
@@ -569,8 +620,6 @@ Test whether {name} has mastered: {concept_name}
         mistakes: List[str]
     ) -> str:
         """Build prompt for re-teaching"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
         instructions = self.RETEACH_INSTRUCTIONS.format(
             name=session.student.name,
             concept_name=concept.name,
@@ -580,29 +629,19 @@ Test whether {name} has mastered: {concept_name}
             concept_id=concept.concept_id
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
     
     def build_wrapup_prompt(self, session: Session) -> str:
         """Build prompt for session wrap-up"""
-        system = self.BASE_PERSONA + "\n" + self.build_student_context(session)
-        
-        # Calculate duration
-        duration = 0
-        if session.created_at:
-            from datetime import datetime
-            now = datetime.utcnow()
-            created = session.created_at if isinstance(session.created_at, datetime) else datetime.fromisoformat(str(session.created_at).replace('Z', '+00:00'))
-            duration = int((now - created.replace(tzinfo=None)).total_seconds() / 60)
-        
         instructions = self.SESSION_WRAPUP_INSTRUCTIONS.format(
-            duration=duration or session.stats.duration_minutes,
+            duration=session.stats.duration_minutes or session.elapsed_minutes(),
             concepts_covered=session.stats.concepts_taught,
             concepts_mastered=session.stats.concepts_mastered,
             accuracy=int(session.stats.accuracy_rate * 100),
             xp_earned=session.stats.xp_earned
         )
         
-        return system + "\n" + instructions
+        return self._assemble(session, instructions)
 
 
 # Singleton instance
@@ -1,34 +1,166 @@
 """
 Session Manager - Handles JSON session file operations
 """
-import json
+import asyncio
 import os
-from datetime import datetime
-from typing import Optional, List
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Callable
 from pathlib import Path
-import shutil
+
+import orjson
 
 from config import settings
 from models import (
     Session, SessionStatus, CurrentPhase, StudentSnapshot,
-    LearningPreferences, SessionMeta, Message
+    LearningPreferences, SessionMeta, Message, MessageRole,
+    SessionDetail, SessionDetailResponse
 )
 
 
+# Columns of the session index (also the keys of each list_sessions record)
+_INDEX_COLUMNS = (
+    "session_id", "student_id", "subject", "chapter",
+    "status", "created_at", "updated_at", "current_phase"
+)
+
+# Fields of a serialized session that feed the index
+_INDEX_FIELDS = {
+    "session_id": True,
+    "student_id": True,
+    "status": True,
+    "created_at": True,
+    "updated_at": True,
+    "current_phase": True,
+    "meta": {"subject", "chapter"},
+}
+
+
+def _index_row(data: dict) -> Tuple:
+    """Index row for a session, from its JSON-mode dict"""
+    meta = data.get("meta") or {}
+    return (
+        data.get("session_id"),
+        data.get("student_id"),
+        meta.get("subject"),
+        meta.get("chapter"),
+        data.get("status"),
+        data.get("created_at"),
+        data.get("updated_at"),
+        data.get("current_phase"),
+    )
+
+
+# Session cache entry: (expires_at, file key, raw session JSON, rendered detail JSON or None)
+_CacheEntry = Tuple[float, Tuple[int, int, int], bytes, Optional[str]]
+
+
+def _file_key(st: os.stat_result) -> Tuple[int, int, int]:
+    """Identity of one version of a session file (every save writes a new file)"""
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
 class SessionManager:
     """Manages session JSON files"""
     
     def __init__(self):
         self.sessions_dir = Path(settings.SESSIONS_DIR)
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Sidecar index of the summary fields list_sessions returns, kept in step
+        # by save/delete, so listing never has to open every session file
+        index_path = self.sessions_dir / "index.sqlite3"
+        is_new_index = not index_path.exists()
+        self._index_lock = threading.Lock()
+        self._index = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute("PRAGMA synchronous=NORMAL")
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, student_id TEXT, subject TEXT, chapter TEXT, "
+            "status TEXT, created_at TEXT, updated_at TEXT, current_phase TEXT)"
+        )
+        self._index.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_by_student ON sessions (student_id, updated_at)"
+        )
+        if is_new_index:
+            self.rebuild_index()
+        
+        # LRU of the JSON last written/read per session, so repeat loads skip the disk.
+        # Raw JSON (not Session objects) is cached: every load still validates into a
+        # fresh model, so callers never share or leak unsaved mutations.
+        # A hit is only served while the file on disk still has the entry's key, so
+        # saves by other workers or processes are never hidden by the cache.
+        self.cache_max_entries = settings.SESSION_CACHE_MAX_ENTRIES
+        self.cache_ttl_seconds = settings.SESSION_CACHE_TTL_SECONDS
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Striped locks for save_session (bounded, unlike one lock per session)
+        self._save_locks = [threading.Lock() for _ in range(64)]
+    
+    def _cache_entry(self, session_id: str) -> Optional[_CacheEntry]:
+        """Return the cache entry for a session if present, not expired and still on disk
+        
+        One stat of the session file per hit; the read and parse are skipped.
+        """
+        try:
+            file_key = _file_key(os.stat(self._get_session_path(session_id)))
+        except OSError:
+            file_key = None
+        
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is None:
+                return None
+            
+            if entry[0] < time.monotonic() or entry[1] != file_key:
+                del self._cache[session_id]
+                return None
+            
+            self._cache.move_to_end(session_id)
+            return entry
+    
+    def _cache_put(self, session_id: str, file_key: Tuple[int, int, int], raw: bytes) -> None:
+        """Store session JSON of the file with `file_key`, evicting the least recently used entries"""
+        with self._cache_lock:
+            self._cache[session_id] = (time.monotonic() + self.cache_ttl_seconds, file_key, raw, None)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+    
+    def _cache_put_detail(self, session_id: str, raw: bytes, detail: str) -> None:
+        """Attach a rendered detail body, unless the session was saved since `raw` was read"""
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry[2] is raw:
+                self._cache[session_id] = (entry[0], entry[1], raw, detail)
+    
+    def _save_lock(self, session_id: str) -> threading.Lock:
+        """Lock serializing the final steps of saves of one session"""
+        return self._save_locks[hash(session_id) % len(self._save_locks)]
+    
+    def invalidate(self, session_id: str) -> None:
+        """
+        Drop a session from the in-process cache
+        
+        Changes made to a session file elsewhere are picked up without it
+        (cache hits check the file first); this just frees the entry.
+        """
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
     
     def _get_session_path(self, session_id: str) -> Path:
         """Get path to session JSON file"""
         return self.sessions_dir / f"session_{session_id}.json"
     
-    def _serialize_session(self, session: Session) -> dict:
-        """Convert session to JSON-serializable dict"""
-        return json.loads(session.model_dump_json())
+    def _serialize_session(self, session: Session) -> bytes:
+        """Convert session to JSON bytes (single pass in pydantic-core, no str round trip)"""
+        return session.__pydantic_serializer__.to_json(session)
     
     def _deserialize_session(self, data: dict) -> Session:
         """Convert dict back to Session model"""
@@ -91,40 +223,128 @@ class SessionManager:
     
     def save_session(self, session: Session) -> bool:
         """Save session to JSON file (atomic write)"""
+        temp_path = None
         try:
             session.update_timestamp()
+            session.version += 1
             
             file_path = self._get_session_path(session.session_id)
-            temp_path = file_path.with_suffix('.tmp')
-            
-            # Write to temp file first
-            with open(temp_path, 'w') as f:
-                json.dump(self._serialize_session(session), f, indent=2, default=str)
+            raw = self._serialize_session(session)
             
-            # Atomic rename
-            shutil.move(str(temp_path), str(file_path))
+            # Write to a temp file of our own (concurrent saves of one session run on
+            # separate threads), on disk before the rename makes it visible
+            fd, temp_path = tempfile.mkstemp(
+                dir=self.sessions_dir, prefix=f"session_{session.session_id}.", suffix=".tmp"
+            )
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+                # The rename keeps inode and mtime, so this is the saved file's key
+                file_key = _file_key(os.fstat(f.fileno()))
             
+            # Rename, cache and index together, so they all end on the same save
+            with self._save_lock(session.session_id):
+                os.replace(temp_path, file_path)
+                temp_path = None
+                self._cache_put(session.session_id, file_key, raw)
+                self._index_upsert(session)
             return True
         except Exception as e:
+            self.invalidate(session.session_id)
             print(f"Error saving session: {e}")
             return False
+        finally:
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+    
+    def _load(self, session_id: str) -> Optional[Tuple[bytes, Session]]:
+        """Read session JSON (cache first, then disk) and validate it"""
+        entry = self._cache_entry(session_id)
+        if entry is not None:
+            return entry[2], self._deserialize_session(orjson.loads(entry[2]))
+        
+        file_path = self._get_session_path(session_id)
+        
+        if not file_path.exists():
+            return None
+        
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+            file_key = _file_key(os.fstat(f.fileno()))
+        
+        # Validate before caching so a corrupt file is never served from memory
+        session = self._deserialize_session(orjson.loads(raw))
+        self._cache_put(session_id, file_key, raw)
+        return raw, session
     
     def load_session(self, session_id: str) -> Optional[Session]:
         """Load session from JSON file"""
         try:
-            file_path = self._get_session_path(session_id)
+            loaded = self._load(session_id)
+            return loaded[1] if loaded else None
+        except Exception as e:
+            print(f"Error loading session: {e}")
+            return None
+    
+    def load_session_detail(self, session_id: str) -> Optional[str]:
+        """
+        Load the GET /session/{id} response body as JSON
+        
+        The rendered body is cached with the session file and dropped
+        whenever the session is saved again.
+        """
+        try:
+            entry = self._cache_entry(session_id)
+            if entry is not None and entry[3] is not None:
+                return entry[3]
             
-            if not file_path.exists():
+            loaded = self._load(session_id)
+            if loaded is None:
                 return None
             
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            
-            return self._deserialize_session(data)
+            raw, session = loaded
+            detail = SessionDetailResponse(session=SessionDetail.from_session(session)).model_dump_json()
+            self._cache_put_detail(session_id, raw, detail)
+            return detail
         except Exception as e:
             print(f"Error loading session: {e}")
             return None
     
+    def mutate(self, session_id: str, fn: Callable[[Session], None]) -> Optional[Session]:
+        """
+        Load a session, apply `fn` to it and save it, in one read and one write
+        
+        Returns the updated session (so callers can keep using it without
+        reloading), or None if the session does not exist.
+        """
+        session = self.load_session(session_id)
+        if session is None:
+            return None
+        
+        fn(session)
+        self.save_session(session)
+        return session
+    
+    # Async variants for request handlers: file reads, the fsync in
+    # save_session and the index write run on a worker thread, so they do not
+    # stall the event loop while other requests are waiting on the LLM
+    
+    async def aload_session(self, session_id: str) -> Optional[Session]:
+        """load_session without blocking the event loop"""
+        return await asyncio.to_thread(self.load_session, session_id)
+    
+    async def asave_session(self, session: Session) -> bool:
+        """save_session without blocking the event loop"""
+        return await asyncio.to_thread(self.save_session, session)
+    
+    async def amutate(self, session_id: str, fn: Callable[[Session], None]) -> Optional[Session]:
+        """mutate without blocking the event loop"""
+        return await asyncio.to_thread(self.mutate, session_id, fn)
+    
     def session_exists(self, session_id: str) -> bool:
         """Check if session exists"""
         return self._get_session_path(session_id).exists()
@@ -132,54 +352,93 @@ class SessionManager:
     def delete_session(self, session_id: str) -> bool:
         """Delete a session file"""
         try:
-            file_path = self._get_session_path(session_id)
-            if file_path.exists():
-                file_path.unlink()
+            # Same lock as the end of save_session, so a concurrent save lands
+            # entirely before or after the delete (never file without index row)
+            with self._save_lock(session_id):
+                self.invalidate(session_id)
+                file_path = self._get_session_path(session_id)
+                if file_path.exists():
+                    file_path.unlink()
+                with self._index_lock:
+                    self._index.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
             return True
         except Exception as e:
             print(f"Error deleting session: {e}")
             return False
     
-    def list_sessions(self, student_id: Optional[str] = None) -> List[dict]:
-        """List all sessions, optionally filtered by student"""
-        sessions = []
+    def _index_upsert(self, session: Session) -> None:
+        """Record a saved session's summary fields in the index"""
+        try:
+            row = _index_row(session.model_dump(mode="json", include=_INDEX_FIELDS))
+            with self._index_lock:
+                self._index.execute(
+                    f"INSERT OR REPLACE INTO sessions VALUES ({', '.join('?' * len(_INDEX_COLUMNS))})",
+                    row
+                )
+        except Exception as e:
+            print(f"Error indexing session {session.session_id}: {e}")
+    
+    def _read_index_row(self, path: str) -> Optional[Tuple]:
+        """Index row for one session file, or None if it cannot be read"""
+        try:
+            with open(path, 'rb') as f:
+                return _index_row(orjson.loads(f.read()))
+        except Exception as e:
+            print(f"Error reading session file {path}: {e}")
+            return None
+    
+    def rebuild_index(self) -> None:
+        """
+        Rebuild the session index from the session files on disk
+        
+        Runs automatically when the index is first created; call it again
+        after adding or editing session files outside this manager.
+        """
+        with os.scandir(self.sessions_dir) as it:
+            paths = [
+                entry.path for entry in it
+                if entry.name.startswith("session_") and entry.name.endswith(".json")
+            ]
+        
+        # Reads dominate on a cold page cache, so fetch files concurrently
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            rows = [row for row in pool.map(self._read_index_row, paths) if row is not None]
         
-        for file_path in self.sessions_dir.glob("session_*.json"):
+        with self._index_lock:
+            self._index.execute("BEGIN")
             try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                
-                if student_id is None or data.get('student_id') == student_id:
-                    sessions.append({
-                        'session_id': data.get('session_id'),
-                        'student_id': data.get('student_id'),
-                        'subject': data.get('meta', {}).get('subject'),
-                        'chapter': data.get('meta', {}).get('chapter'),
-                        'status': data.get('status'),
-                        'created_at': data.get('created_at'),
-                        'updated_at': data.get('updated_at'),
-                        'current_phase': data.get('current_phase')
-                    })
-            except Exception as e:
-                print(f"Error reading session file {file_path}: {e}")
-        
-        return sorted(sessions, key=lambda x: x.get('updated_at', ''), reverse=True)
-    
-    def add_message(self, session: Session, role: str, content: str) -> Session:
+                self._index.execute("DELETE FROM sessions")
+                self._index.executemany(
+                    f"INSERT OR REPLACE INTO sessions VALUES ({', '.join('?' * len(_INDEX_COLUMNS))})",
+                    rows
+                )
+                self._index.execute("COMMIT")
+            except Exception:
+                self._index.execute("ROLLBACK")
+                raise
+    
+    def list_sessions(self, student_id: Optional[str] = None) -> List[dict]:
+        """List all sessions, optionally filtered by student (most recently updated first)"""
+        query = f"SELECT {', '.join(_INDEX_COLUMNS)} FROM sessions"
+        params: Tuple = ()
+        if student_id is not None:
+            query += " WHERE student_id = ?"
+            params = (student_id,)
+        query += " ORDER BY updated_at DESC"
+        
+        with self._index_lock:
+            rows = self._index.execute(query, params).fetchall()
+        
+        return [dict(zip(_INDEX_COLUMNS, row)) for row in rows]
+    
+    def add_message(self, session: Session, role: MessageRole, content: str) -> Session:
         """Add a message to conversation context"""
-        message = Message(
-            role=role,
-            content=content,
-            timestamp=datetime.utcnow()
-        )
+        message = Message(role=role, content=content)  # timestamp defaults to now (UTC)
         
+        # recent_messages is a bounded deque, so old messages drop off here
         session.conversation.recent_messages.append(message)
         session.conversation.total_messages += 1
         
-        # Keep only last 10 messages for context
-        if len(session.conversation.recent_messages) > 10:
-            session.conversation.recent_messages = session.conversation.recent_messages[-10:]
-        
         return session
     
     def update_phase(self, session: Session, phase: CurrentPhase) -> Session:
@@ -202,12 +461,7 @@ class SessionManager:
         session.stats.hints_used += hints_used
         session.stats.xp_earned += xp_earned
         
-        # Recalculate accuracy
-        if session.stats.questions_attempted > 0:
-            session.stats.accuracy_rate = (
-                session.stats.questions_correct / session.stats.questions_attempted
-            )
-        
+        # accuracy_rate is derived from the counters, nothing to recalculate
         return session
 
 
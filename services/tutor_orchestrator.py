@@ -1,27 +1,151 @@
 """
 Tutor Orchestrator - Main brain that coordinates all services
 """
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+from typing import Optional, Dict, Any, Awaitable, Callable, List
+import asyncio
+import logging
 import uuid
 
 from models import (
     Session, CurrentPhase, SessionStatus, PhaseStatus, ConceptStatus,
     DiagnosticQuestion, DiagnosticAssessment, Misconception,
     ConceptPlan, StudyPlan, TeachingLogEntry, Message,
-    QuestionType, Difficulty, LearningStyle,
+    LearningStyle,
     MultipleChoiceQuestion, MultipleChoiceOption,
     TrueFalseQuestion, NumericQuestion, EquationQuestion,
     FillBlankQuestion, ShortAnswerQuestion,
     MessageResponse, QuestionDisplay, FeedbackDisplay,
-    StudyPlanDisplay, ProgressDisplay, CelebrationDisplay,
-    APIResponse
+    StudyPlanConcept, StudyPlanDisplay, ProgressDisplay, CelebrationDisplay,
+    APIResponse, utcnow
 )
 from services.session_manager import session_manager
 from services.prompt_builder import prompt_builder
-from services.llm_service import llm_service
+from services.llm_service import llm_service, JsonFieldStream
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+# Answers read as "true" for true/false questions (case-insensitive)
+_TRUE_TOKENS = frozenset(("true", "yes", "t", "1"))
+
+# LLM "teaching_approach" value -> LearningStyle (unknown values fall back to examples)
+_LEARNING_STYLES: Dict[str, LearningStyle] = {style.value: style for style in LearningStyle}
+
+
+# ============ Question Parsers ============
+# Each builds a question model from LLM question data plus the shared base fields
+
+def _parse_multiple_choice(q_data: Dict, base_data: Dict) -> MultipleChoiceQuestion:
+    options = q_data.get("options", [])
+    correct = q_data.get("correct_answer", "")
+    
+    parsed_options = []
+    correct_id = "a"
+    correct_lc = correct.lower()
+    correct_first = correct_lc[:1]
+    
+    for i, opt in enumerate(options):
+        opt_id = chr(97 + i)  # a, b, c, d
+        opt_text = opt
+        
+        # Handle "A) text" format
+        if ")" in opt:
+            parts = opt.split(")", 1)
+            opt_text = parts[1].strip() if len(parts) > 1 else opt
+        
+        opt_lc = opt.lower()
+        is_correct = (
+            opt_lc.startswith(correct_first) or 
+            opt_text.lower() == correct_lc or
+            correct_lc in opt_lc
+        )
+        
+        if is_correct:
+            correct_id = opt_id
+        
+        parsed_options.append(MultipleChoiceOption(
+            id=opt_id,
+            text=opt_text,
+            is_correct=is_correct
+        ))
+    
+    return MultipleChoiceQuestion(
+        question_text=q_data.get("question_text", ""),
+        options=parsed_options,
+        correct_option_id=correct_id,
+        **base_data
+    )
+
+
+def _parse_true_false(q_data: Dict, base_data: Dict) -> TrueFalseQuestion:
+    correct = q_data.get("correct_answer", "true")
+    is_true = str(correct).lower() in _TRUE_TOKENS  # JSON mode may hand back a bool
+    
+    return TrueFalseQuestion(
+        statement=q_data.get("question_text", ""),
+        correct_answer=is_true,
+        **base_data
+    )
+
+
+def _parse_numeric(q_data: Dict, base_data: Dict) -> NumericQuestion:
+    try:
+        correct = float(q_data.get("correct_answer", 0))
+    except:
+        correct = 0.0
+    
+    return NumericQuestion(
+        question_text=q_data.get("question_text", ""),
+        correct_answer=correct,
+        tolerance=0.01,
+        **base_data
+    )
+
+
+def _parse_equation(q_data: Dict, base_data: Dict) -> EquationQuestion:
+    try:
+        correct = float(q_data.get("correct_answer", 0))
+    except:
+        correct = 0.0
+    
+    return EquationQuestion(
+        question_text=q_data.get("question_text", ""),
+        equation=q_data.get("equation", q_data.get("question_text", "")),
+        correct_answer=correct,
+        **base_data
+    )
+
+
+def _parse_fill_blank(q_data: Dict, base_data: Dict) -> FillBlankQuestion:
+    correct = q_data.get("correct_answer", "")
+    answers = [correct] if isinstance(correct, str) else correct
+    
+    return FillBlankQuestion(
+        question_text=q_data.get("question_text", ""),
+        correct_answers=answers,
+        **base_data
+    )
+
+
+def _parse_short_answer(q_data: Dict, base_data: Dict) -> ShortAnswerQuestion:
+    return ShortAnswerQuestion(
+        question_text=q_data.get("question_text", ""),
+        sample_answer=q_data.get("correct_answer", ""),
+        **base_data
+    )
+
+
+# LLM "type" value -> parser (anything unknown is treated as short_answer)
+_QUESTION_PARSERS: Dict[str, Callable[[Dict, Dict], Any]] = {
+    "multiple_choice": _parse_multiple_choice,
+    "true_false": _parse_true_false,
+    "numeric": _parse_numeric,
+    "equation": _parse_equation,
+    "fill_blank": _parse_fill_blank,
+    "short_answer": _parse_short_answer,
+}
+
 
 class TutorOrchestrator:
     """Main orchestrator that coordinates all tutoring logic"""
@@ -30,6 +154,7 @@ class TutorOrchestrator:
         self.session_manager = session_manager
         self.prompt_builder = prompt_builder
         self.llm = llm_service
+        self.max_diagnostic_questions = settings.MAX_DIAGNOSTIC_QUESTIONS
     
     # ============ Helper Methods ============
     
@@ -38,103 +163,15 @@ class TutorOrchestrator:
         q_type = q_data.get("type", "short_answer")
         
         base_data = {
-            "question_id": q_data.get("question_id", str(uuid.uuid4())[:8]),
-            "difficulty": Difficulty(q_data.get("difficulty", "medium")),
+            "question_id": q_data.get("question_id") or uuid.uuid4().hex[:8],
+            "difficulty": q_data.get("difficulty", "medium"),
             "concept_tested": q_data.get("concept_tested", "general"),
             "hint": q_data.get("hint"),
             "explanation": q_data.get("explanation")
         }
         
-        if q_type == "multiple_choice":
-            options = q_data.get("options", [])
-            correct = q_data.get("correct_answer", "")
-            
-            parsed_options = []
-            correct_id = "a"
-            
-            for i, opt in enumerate(options):
-                opt_id = chr(97 + i)  # a, b, c, d
-                opt_text = opt
-                
-                # Handle "A) text" format
-                if ")" in opt:
-                    parts = opt.split(")", 1)
-                    opt_text = parts[1].strip() if len(parts) > 1 else opt
-                
-                is_correct = (
-                    opt.lower().startswith(correct.lower()[:1]) or 
-                    opt_text.lower() == correct.lower() or
-                    correct.lower() in opt.lower()
-                )
-                
-                if is_correct:
-                    correct_id = opt_id
-                
-                parsed_options.append(MultipleChoiceOption(
-                    id=opt_id,
-                    text=opt_text,
-                    is_correct=is_correct
-                ))
-            
-            return MultipleChoiceQuestion(
-                question_text=q_data.get("question_text", ""),
-                options=parsed_options,
-                correct_option_id=correct_id,
-                **base_data
-            )
-        
-        elif q_type == "true_false":
-            correct = q_data.get("correct_answer", "true")
-            is_true = correct.lower() in ["true", "yes", "t"]
-            
-            return TrueFalseQuestion(
-                statement=q_data.get("question_text", ""),
-                correct_answer=is_true,
-                **base_data
-            )
-        
-        elif q_type == "numeric":
-            try:
-                correct = float(q_data.get("correct_answer", 0))
-            except:
-                correct = 0.0
-            
-            return NumericQuestion(
-                question_text=q_data.get("question_text", ""),
-                correct_answer=correct,
-                tolerance=0.01,
-                **base_data
-            )
-        
-        elif q_type == "equation":
-            try:
-                correct = float(q_data.get("correct_answer", 0))
-            except:
-                correct = 0.0
-            
-            return EquationQuestion(
-                question_text=q_data.get("question_text", ""),
-                equation=q_data.get("equation", q_data.get("question_text", "")),
-                correct_answer=correct,
-                **base_data
-            )
-        
-        elif q_type == "fill_blank":
-            correct = q_data.get("correct_answer", "")
-            answers = [correct] if isinstance(correct, str) else correct
-            
-            return FillBlankQuestion(
-                question_text=q_data.get("question_text", ""),
-                correct_answers=answers,
-                **base_data
-            )
-        
-        else:  # short_answer
-            return ShortAnswerQuestion(
-                question_text=q_data.get("question_text", ""),
-                sample_answer=q_data.get("correct_answer", ""),
-                **base_data
-            )
+        parse = _QUESTION_PARSERS.get(q_type, _parse_short_answer)
+        return parse(q_data, base_data)
     
     def _create_progress_display(self, session: Session) -> ProgressDisplay:
         """Create progress display from session"""
@@ -159,7 +196,7 @@ class TutorOrchestrator:
             return is_correct, 1.0 if is_correct else 0.0, correct
         
         elif isinstance(question, TrueFalseQuestion):
-            student_bool = str(answer).lower() in ["true", "yes", "t", "1"]
+            student_bool = str(answer).lower() in _TRUE_TOKENS
             is_correct = student_bool == question.correct_answer
             return is_correct, 1.0 if is_correct else 0.0, str(question.correct_answer)
         
@@ -184,10 +221,10 @@ class TutorOrchestrator:
     
     # ============ Main Flow Methods ============
     
-    async def start_diagnostic(self, session_id: str) -> APIResponse:
+    async def start_diagnostic(self, session_id: str, session: Optional[Session] = None) -> APIResponse:
         """Start diagnostic assessment phase"""
         try:
-            session = self.session_manager.load_session(session_id)
+            session = session or await self.session_manager.aload_session(session_id)
             if not session:
                 return APIResponse(
                     success=False,
@@ -200,7 +237,7 @@ class TutorOrchestrator:
             # Update phase
             session.current_phase = CurrentPhase.DIAGNOSTIC
             session.diagnostic.status = PhaseStatus.IN_PROGRESS
-            session.diagnostic.started_at = datetime.utcnow()
+            session.diagnostic.started_at = utcnow()
             
             # Generate first diagnostic question
             prompt = self.prompt_builder.build_diagnostic_prompt(
@@ -209,7 +246,7 @@ class TutorOrchestrator:
                 is_first=True
             )
             
-            result = self.llm.generate_sync(prompt)
+            result = await self.llm.generate(prompt)
             
             if not result["success"]:
                 return APIResponse(
@@ -242,7 +279,7 @@ class TutorOrchestrator:
             session = self.session_manager.add_message(session, "assistant", message)
             
             # Save session
-            self.session_manager.save_session(session)
+            await self.session_manager.asave_session(session)
             
             # Build response
             display = []
@@ -265,10 +302,7 @@ class TutorOrchestrator:
             )
         
         except Exception as e:
-            import traceback
-            error_msg = f"Error in start_diagnostic: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            print(traceback.format_exc())
+            logger.exception("Error in start_diagnostic")
             return APIResponse(
                 success=False,
                 session_id=session_id,
@@ -281,11 +315,12 @@ class TutorOrchestrator:
         self, 
         session_id: str, 
         question_id: str,
-        answer: Any
+        answer: Any,
+        session: Optional[Session] = None
     ) -> APIResponse:
         """Process a diagnostic answer and continue assessment"""
         try:
-            session = self.session_manager.load_session(session_id)
+            session = session or await self.session_manager.aload_session(session_id)
             if not session:
                 return APIResponse(
                     success=False,
@@ -321,7 +356,7 @@ class TutorOrchestrator:
                 questions_asked=len(session.diagnostic.questions)
             )
             
-            result = self.llm.generate_sync(prompt)
+            result = await self.llm.generate(prompt)
             
             if not result["success"]:
                 return APIResponse(
@@ -344,7 +379,6 @@ class TutorOrchestrator:
             session.stats.questions_attempted += 1
             if eval_data.get("is_correct"):
                 session.stats.questions_correct += 1
-            session.stats.accuracy_rate = session.stats.questions_correct / max(1, session.stats.questions_attempted)
             
             # Add feedback message
             feedback = response_data.get("feedback_to_student", "")
@@ -353,7 +387,7 @@ class TutorOrchestrator:
             display = []
             
             # Check if diagnostic is complete
-            if response_data.get("diagnostic_complete") or len(session.diagnostic.questions) >= settings.MAX_DIAGNOSTIC_QUESTIONS:
+            if response_data.get("diagnostic_complete") or len(session.diagnostic.questions) >= self.max_diagnostic_questions:
                 # Store final assessment
                 final = response_data.get("final_assessment", {})
                 session.diagnostic.assessment = DiagnosticAssessment(
@@ -373,7 +407,7 @@ class TutorOrchestrator:
                     personalized_note="Assessment complete"
                 )
                 session.diagnostic.status = PhaseStatus.COMPLETED
-                session.diagnostic.completed_at = datetime.utcnow()
+                session.diagnostic.completed_at = utcnow()
                 
                 # Move to plan generation
                 session.current_phase = CurrentPhase.PLAN_GENERATION
@@ -419,7 +453,7 @@ class TutorOrchestrator:
                             show_hint_button=True
                         ))
             
-            self.session_manager.save_session(session)
+            await self.session_manager.asave_session(session)
             
             return APIResponse(
                 success=True,
@@ -430,10 +464,7 @@ class TutorOrchestrator:
             )
         
         except Exception as e:
-            import traceback
-            error_msg = f"Error in submit_diagnostic_answer: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            print(traceback.format_exc())
+            logger.exception("Error in submit_diagnostic_answer")
             return APIResponse(
                 success=False,
                 session_id=session_id,
@@ -442,10 +473,10 @@ class TutorOrchestrator:
                 error=str(e)
             )
     
-    async def generate_study_plan(self, session_id: str) -> APIResponse:
+    async def generate_study_plan(self, session_id: str, session: Optional[Session] = None) -> APIResponse:
         """Generate personalized study plan"""
         try:
-            session = self.session_manager.load_session(session_id)
+            session = session or await self.session_manager.aload_session(session_id)
             if not session:
                 return APIResponse(
                     success=False,
@@ -456,7 +487,7 @@ class TutorOrchestrator:
                 )
             
             prompt = self.prompt_builder.build_study_plan_prompt(session)
-            result = self.llm.generate_sync(prompt)
+            result = await self.llm.generate(prompt)
             
             if not result["success"]:
                 return APIResponse(
@@ -481,14 +512,14 @@ class TutorOrchestrator:
                     estimated_minutes=c.get("estimated_minutes", 5),
                     order=i + 1,
                     prerequisites=c.get("prerequisites", []),
-                    teaching_approach=LearningStyle(c.get("teaching_approach", "examples")),
+                    teaching_approach=_LEARNING_STYLES.get(c.get("teaching_approach"), LearningStyle.EXAMPLES),
                     real_world_hook=c.get("real_world_hook"),
                     status=ConceptStatus.NOT_STARTED
                 )
                 concepts.append(concept)
             
             session.study_plan = StudyPlan(
-                generated_at=datetime.utcnow(),
+                generated_at=utcnow(),
                 total_concepts=len(concepts),
                 estimated_time_minutes=plan_data.get("estimated_time_minutes", 30),
                 concepts=concepts,
@@ -500,7 +531,7 @@ class TutorOrchestrator:
             message = response_data.get("message_to_student", "Here's your personalized study plan!")
             session = self.session_manager.add_message(session, "assistant", message)
             
-            self.session_manager.save_session(session)
+            await self.session_manager.asave_session(session)
             
             # Build display
             display = [
@@ -509,14 +540,14 @@ class TutorOrchestrator:
                     message="Let's get started!",
                     total_concepts=len(concepts),
                     estimated_minutes=plan_data.get("estimated_time_minutes", 30),
-                    concepts=[{
-                    "id": c.concept_id,
-                    "name": c.name,
-                    "description": c.description,
-                    "difficulty": c.difficulty,
-                    "estimated_minutes": c.estimated_minutes,
-                    "status": c.status.value
-                } for c in concepts]
+                    concepts=[StudyPlanConcept(
+                        id=c.concept_id,
+                        name=c.name,
+                        description=c.description,
+                        difficulty=c.difficulty,
+                        estimated_minutes=c.estimated_minutes,
+                        status=c.status.value
+                    ) for c in concepts]
                 )
             ]
             
@@ -529,10 +560,7 @@ class TutorOrchestrator:
             )
         
         except Exception as e:
-            import traceback
-            error_msg = f"Error in generate_study_plan: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            print(traceback.format_exc())
+            logger.exception("Error in generate_study_plan")
             return APIResponse(
                 success=False,
                 session_id=session_id,
@@ -541,10 +569,20 @@ class TutorOrchestrator:
                 error=str(e)
             )
     
-    async def start_teaching_concept(self, session_id: str) -> APIResponse:
-        """Start teaching the current concept"""
+    async def start_teaching_concept(
+        self,
+        session_id: str,
+        session: Optional[Session] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> APIResponse:
+        """
+        Start teaching the current concept
+        
+        If `on_token` is given, the text of `teaching_content` is streamed
+        to it as the model writes its JSON reply.
+        """
         try:
-            session = self.session_manager.load_session(session_id)
+            session = session or await self.session_manager.aload_session(session_id)
             if not session:
                 return APIResponse(
                     success=False,
@@ -566,15 +604,17 @@ class TutorOrchestrator:
             idx = session.study_plan.current_concept_index
             if idx >= len(session.study_plan.concepts):
                 # All concepts done - wrap up
-                return await self.wrap_up_session(session_id)
+                return await self.wrap_up_session(session_id, session=session)
             
             concept = session.study_plan.concepts[idx]
             concept.status = ConceptStatus.LEARNING
-            concept.started_at = datetime.utcnow()
+            concept.started_at = utcnow()
             concept.attempts = 0
             
             prompt = self.prompt_builder.build_teaching_prompt(session, concept)
-            result = self.llm.generate_sync(prompt)
+            if on_token is not None:
+                on_token = JsonFieldStream("teaching_content", on_token)
+            result = await self.llm.generate(prompt, on_token=on_token)
             
             if not result["success"]:
                 return APIResponse(
@@ -628,7 +668,7 @@ class TutorOrchestrator:
                 ))
             
             session.stats.concepts_taught += 1
-            self.session_manager.save_session(session)
+            await self.session_manager.asave_session(session)
             
             return APIResponse(
                 success=True,
@@ -639,10 +679,7 @@ class TutorOrchestrator:
             )
         
         except Exception as e:
-            import traceback
-            error_msg = f"Error in start_teaching_concept: {str(e)}"
-            print(f"ERROR: {error_msg}")
-            print(traceback.format_exc())
+            logger.exception("Error in start_teaching_concept")
             return APIResponse(
                 success=False,
                 session_id=session_id,
@@ -655,10 +692,11 @@ class TutorOrchestrator:
         self,
         session_id: str,
         question_id: str,
-        answer: Any
+        answer: Any,
+        session: Optional[Session] = None
     ) -> APIResponse:
         """Process practice/assessment answer during teaching"""
-        session = self.session_manager.load_session(session_id)
+        session = session or await self.session_manager.aload_session(session_id)
         if not session:
             return APIResponse(
                 success=False,
@@ -672,7 +710,7 @@ class TutorOrchestrator:
         concept = session.study_plan.concepts[idx] if idx < len(session.study_plan.concepts) else None
         
         if not concept:
-            return await self.wrap_up_session(session_id)
+            return await self.wrap_up_session(session_id, session=session)
         
         concept.attempts += 1
         session = self.session_manager.add_message(session, "user", str(answer))
@@ -697,7 +735,7 @@ class TutorOrchestrator:
             hints_given=session.stats.hints_used
         )
         
-        result = self.llm.generate_sync(prompt)
+        result = await self.llm.generate(prompt)
         
         if not result["success"]:
             return APIResponse(
@@ -722,7 +760,6 @@ class TutorOrchestrator:
             session.stats.questions_correct += 1
             concept.mastery_score += 0.25
         session.stats.xp_earned += xp
-        session.stats.accuracy_rate = session.stats.questions_correct / max(1, session.stats.questions_attempted)
         
         # Log response
         session.teaching_log.append(TeachingLogEntry(
@@ -748,7 +785,7 @@ class TutorOrchestrator:
         # Handle next action
         if next_action == "next_concept" or (is_correct and concept.mastery_score >= 0.75):
             concept.status = ConceptStatus.MASTERED
-            concept.completed_at = datetime.utcnow()
+            concept.completed_at = utcnow()
             session.stats.concepts_mastered += 1
             session.study_plan.current_concept_index += 1
             
@@ -802,7 +839,7 @@ class TutorOrchestrator:
                         ai_message=next_q.get("question_text", "")
                     ))
         
-        self.session_manager.save_session(session)
+        await self.session_manager.asave_session(session)
         
         return APIResponse(
             success=True,
@@ -812,9 +849,9 @@ class TutorOrchestrator:
             progress=self._create_progress_display(session)
         )
     
-    async def get_hint(self, session_id: str, question_id: str) -> APIResponse:
+    async def get_hint(self, session_id: str, question_id: str, session: Optional[Session] = None) -> APIResponse:
         """Get hint for current question"""
-        session = self.session_manager.load_session(session_id)
+        session = session or await self.session_manager.aload_session(session_id)
         if not session:
             return APIResponse(
                 success=False,
@@ -834,7 +871,7 @@ class TutorOrchestrator:
                 hint = f"Think about: {entry.ai_message[:100]}... What's the first step?"
                 break
         
-        self.session_manager.save_session(session)
+        await self.session_manager.asave_session(session)
         
         return APIResponse(
             success=True,
@@ -844,9 +881,19 @@ class TutorOrchestrator:
             progress=self._create_progress_display(session)
         )
     
-    async def wrap_up_session(self, session_id: str) -> APIResponse:
-        """Wrap up the session with summary"""
-        session = self.session_manager.load_session(session_id)
+    async def wrap_up_session(
+        self,
+        session_id: str,
+        session: Optional[Session] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> APIResponse:
+        """
+        Wrap up the session with summary
+        
+        If `on_token` is given, the text of `celebration_message` is
+        streamed to it as the model writes its JSON reply.
+        """
+        session = session or await self.session_manager.aload_session(session_id)
         if not session:
             return APIResponse(
                 success=False,
@@ -859,13 +906,18 @@ class TutorOrchestrator:
         session.current_phase = CurrentPhase.WRAPUP
         session.status = SessionStatus.COMPLETED
         
-        # Calculate duration
-        if session.created_at:
-            created = session.created_at if isinstance(session.created_at, datetime) else datetime.fromisoformat(str(session.created_at).replace('Z', '+00:00'))
-            session.stats.duration_minutes = int((datetime.utcnow() - created.replace(tzinfo=None)).total_seconds() / 60)
+        session.stats.duration_minutes = session.elapsed_minutes()
         
         prompt = self.prompt_builder.build_wrapup_prompt(session)
-        result = self.llm.generate_sync(prompt)
+        if on_token is not None:
+            on_token = JsonFieldStream("celebration_message", on_token)
+        
+        # The summary only feeds the display, so the session is final here:
+        # persist it while the LLM writes the summary
+        result, _ = await asyncio.gather(
+            self.llm.generate(prompt, on_token=on_token),
+            self.session_manager.asave_session(session)
+        )
         
         display = []
         
@@ -896,8 +948,6 @@ class TutorOrchestrator:
                 is_encouragement=True
             ))
         
-        self.session_manager.save_session(session)
-        
         return APIResponse(
             success=True,
             session_id=session_id,
@@ -4,16 +4,26 @@ Test script for AI Tutor Backend
 Run this after starting the server to test the full flow.
 Usage: python test_api.py
 """
+import asyncio
+import json
 import requests
 import time
 
+import httpx
+from groq import AsyncGroq
+
+from services.llm_service import JsonFieldStream, LLMService
+
 BASE_URL = "http://localhost:8000"
 
+# One keep-alive connection pool for every call in the run
+client = requests.Session()
+
 
 def test_health():
     """Test health endpoint"""
     print("\n🏥 Testing health endpoint...")
-    resp = requests.get(f"{BASE_URL}/health")
+    resp = client.get(f"{BASE_URL}/health")
     print(f"   Status: {resp.json()}")
     return resp.json()["status"] == "healthy"
 
@@ -27,7 +37,7 @@ def test_full_flow():
     
     # 1. Create Session
     print("\n📝 Step 1: Creating session...")
-    resp = requests.post(f"{BASE_URL}/session/create", json={
+    resp = client.post(f"{BASE_URL}/session/create", json={
         "student_id": "test_student_001",
         "student_name": "Arjun",
         "class_grade": 8,
@@ -51,7 +61,7 @@ def test_full_flow():
     
     # 2. Start Diagnostic
     print("\n📊 Step 2: Starting diagnostic assessment...")
-    resp = requests.post(f"{BASE_URL}/chat/start-diagnostic?session_id={session_id}")
+    resp = client.post(f"{BASE_URL}/chat/start-diagnostic?session_id={session_id}")
     
     if resp.status_code != 200:
         print(f"   ❌ Failed: {resp.text}")
@@ -78,7 +88,7 @@ def test_full_flow():
             question_id = item.get("question", {}).get("question_id", "diag_q1")
             break
     
-    resp = requests.post(
+    resp = client.post(
         f"{BASE_URL}/chat/submit-diagnostic-answer",
         params={
             "session_id": session_id,
@@ -101,7 +111,7 @@ def test_full_flow():
     
     # 4. Get session progress
     print("\n📈 Step 4: Checking progress...")
-    resp = requests.get(f"{BASE_URL}/session/{session_id}/progress")
+    resp = client.get(f"{BASE_URL}/session/{session_id}/progress")
     
     if resp.status_code != 200:
         print(f"   ❌ Failed: {resp.text}")
@@ -114,7 +124,7 @@ def test_full_flow():
     
     # 5. Cleanup
     print("\n🧹 Step 5: Cleaning up...")
-    resp = requests.delete(f"{BASE_URL}/session/{session_id}")
+    resp = client.delete(f"{BASE_URL}/session/{session_id}")
     print(f"   ✅ Session deleted")
     
     print("\n" + "="*60)
@@ -124,6 +134,146 @@ def test_full_flow():
     return True
 
 
+def _sse_events(resp):
+    """Split a Server-Sent Events body into (event, decoded data) pairs"""
+    events = []
+    for frame in resp.text.strip().split("\n\n"):
+        event_line, data_line = frame.split("\n", 1)
+        if not event_line.startswith("event: ") or not data_line.startswith("data: "):
+            raise ValueError(f"Malformed SSE frame: {frame!r}")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def test_stream_endpoints():
+    """Test the Server-Sent Events variants of start-teaching and end-session"""
+    print("\n📡 Testing streamed endpoints...")
+    
+    resp = client.post(f"{BASE_URL}/session/create", json={
+        "student_id": "test_student_002",
+        "student_name": "Meera",
+        "class_grade": 7,
+        "board": "CBSE",
+        "subject": "Mathematics",
+        "chapter": "Fractions",
+        "topic": "Adding fractions"
+    })
+    session_id = resp.json()["session_id"]
+    
+    try:
+        # Unknown sessions fail before the stream starts
+        resp = client.post(f"{BASE_URL}/chat/start-teaching/stream?session_id=does-not-exist")
+        if resp.status_code != 404:
+            print(f"   ❌ Unknown session: expected 404, got {resp.status_code}")
+            return False
+        
+        # No study plan yet: no tokens, just a failed result
+        resp = client.post(f"{BASE_URL}/chat/start-teaching/stream?session_id={session_id}")
+        events = _sse_events(resp)
+        if not resp.headers["content-type"].startswith("text/event-stream"):
+            print(f"   ❌ Wrong content type: {resp.headers['content-type']}")
+            return False
+        if [event for event, _ in events] != ["result"] or events[0][1]["success"]:
+            print(f"   ❌ Expected a single failed result: {events}")
+            return False
+        print(f"   ✅ Error result: {events[0][1]['error']}")
+        
+        resp = client.post(f"{BASE_URL}/chat/generate-plan?session_id={session_id}")
+        if resp.status_code != 200:
+            print(f"   ❌ Plan failed: {resp.text}")
+            return False
+        
+        # Tokens carry the teaching text only, and add up to the final message
+        resp = client.post(f"{BASE_URL}/chat/start-teaching/stream?session_id={session_id}")
+        events = _sse_events(resp)
+        tokens = "".join(data for event, data in events if event == "token")
+        event, result = events[-1]
+        if event != "result" or not result["success"] or tokens != result["display"][0]["content"]:
+            print(f"   ❌ Teaching stream: tokens={tokens[:80]!r} last={events[-1]}")
+            return False
+        print(f"   ✅ Teaching streamed in {len(events) - 1} tokens")
+        
+        resp = client.post(f"{BASE_URL}/chat/end-session/stream", json={"session_id": session_id})
+        events = _sse_events(resp)
+        tokens = "".join(data for event, data in events if event == "token")
+        event, result = events[-1]
+        celebration = [item for item in result["display"] if item["type"] == "celebration"]
+        if event != "result" or not result["success"] or not celebration or tokens != celebration[0]["message"]:
+            print(f"   ❌ Wrap-up stream: tokens={tokens[:80]!r} last={events[-1]}")
+            return False
+        print(f"   ✅ Wrap-up streamed in {len(events) - 1} tokens")
+        
+        return True
+    finally:
+        client.delete(f"{BASE_URL}/session/{session_id}")
+
+
+def test_json_field_stream():
+    """Field text survives any chunking of the JSON reply (no server needed)"""
+    print("\n🧩 Testing JsonFieldStream chunking...")
+    
+    text = 'Say "½ + ¼" \\ then\nsmile 😀'
+    raw = '{"encouragement": "teaching_content", "teaching_content": %s, "x": "y"}' % json.dumps(text)
+    
+    for size in range(1, 16):
+        tokens = []
+        
+        async def on_token(token):
+            tokens.append(token)
+        
+        async def feed():
+            stream = JsonFieldStream("teaching_content", on_token)
+            for i in range(0, len(raw), size):
+                await stream(raw[i:i + size])
+        
+        asyncio.run(feed())
+        if "".join(tokens) != text:
+            print(f"   ❌ Chunk size {size}: {''.join(tokens)!r}")
+            return False
+    
+    print("   ✅ Escapes and surrogate pairs decoded at every split")
+    return True
+
+
+class _DroppedStream(httpx.AsyncByteStream):
+    """SSE body that sends one completion chunk, then loses the connection"""
+    
+    async def __aiter__(self):
+        yield (
+            b'data: {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": "m", '
+            b'"choices": [{"index": 0, "delta": {"content": "Hel"}, "finish_reason": null}]}\n\n'
+        )
+        raise httpx.ReadError("connection dropped")
+
+
+def test_llm_stream_dropped():
+    """A connection lost mid-stream becomes an error result (no server needed)"""
+    print("\n🔌 Testing dropped LLM stream...")
+    
+    llm = LLMService()
+    llm.async_client = AsyncGroq(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, stream=_DroppedStream()
+            )
+        ))
+    )
+    tokens = []
+    
+    async def on_token(token):
+        tokens.append(token)
+    
+    result = asyncio.run(llm.generate("prompt", expect_json=False, on_token=on_token))
+    
+    if tokens != ["Hel"] or result["success"] or "connection dropped" not in result["error"]:
+        print(f"   ❌ Failed: tokens={tokens} result={result}")
+        return False
+    
+    print(f"   ✅ Error result: {result['error']}")
+    return True
+
+
 def test_without_api_key():
     """Test what happens without API key"""
     print("\n⚠️  Note: Full flow requires GROQ_API_KEY to be set")
@@ -134,11 +284,16 @@ if __name__ == "__main__":
     print("\n🚀 AI Tutor Backend Test Suite")
     print("-" * 40)
     
+    # Offline checks
+    test_json_field_stream()
+    test_llm_stream_dropped()
+    
     # Check if server is running
     try:
         if test_health():
             print("✅ Server is healthy!")
             test_full_flow()
+            test_stream_endpoints()
         else:
             print("❌ Server health check failed")
     except requests.exceptions.ConnectionError: